@@ -0,0 +1 @@
+"""Benchmarks and a stand-in controller for the Apex integration."""
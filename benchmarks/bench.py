@@ -0,0 +1,112 @@
+"""Benchmark the Apex client and coordinator against the fake controller.
+
+Runs a number of polls for each controller size and reports polls/sec, p50/p99
+poll latency, bytes received per poll and peak Python memory allocated while
+polling. Needs Home Assistant (and so aiohttp) installed.
+
+    python -m benchmarks.bench --sizes 10 100 1000 --polls 50 --latency 0.005
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fake_apex import FakeApex
+from custom_components.apex.apex import Apex
+
+USERNAME = "admin"
+PASSWORD = "1234"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+async def measure(fake, polls, poll):
+    """Run poll() polls times and return the collected statistics."""
+    await poll()  # warm up: login, connection set up
+    fake.bytes_sent = 0
+    timings = []
+    tracemalloc.start()
+    started = time.perf_counter()
+    for _ in range(polls):
+        t = time.perf_counter()
+        await poll()
+        timings.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "polls/s": polls / elapsed,
+        "p50 ms": statistics.median(timings) * 1000,
+        "p99 ms": percentile(timings, 99) * 1000,
+        "KiB/poll": fake.bytes_sent / polls / 1024,
+        "peak KiB": peak / 1024,
+    }
+
+
+async def bench_client(size, polls, latency, classic):
+    fake = FakeApex(outputs=size, latency=latency, classic=classic)
+    host = await fake.start()
+    apex = Apex(USERNAME, PASSWORD, host)
+
+    async def poll():
+        await apex.status()
+        await apex.config()
+
+    try:
+        return await measure(fake, polls, poll)
+    finally:
+        await apex.close()
+        await fake.stop()
+
+
+async def bench_coordinator(size, polls, latency, classic):
+    from homeassistant.core import HomeAssistant
+    from homeassistant.helpers import frame
+
+    from custom_components.apex import ApexDataUpdateCoordinator
+
+    fake = FakeApex(outputs=size, latency=latency, classic=classic)
+    host = await fake.start()
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        frame.async_setup(hass)
+        coordinator = ApexDataUpdateCoordinator(hass, USERNAME, PASSWORD, host, 60, 3600)
+        try:
+            return await measure(fake, polls, coordinator.async_refresh)
+        finally:
+            await coordinator.apex.close()
+            await hass.async_stop(force=True)
+            await fake.stop()
+
+
+def report(name, results):
+    columns = ["outputs", "polls/s", "p50 ms", "p99 ms", "KiB/poll", "peak KiB"]
+    print(f"\n{name}")
+    print("  ".join(f"{column:>10}" for column in columns))
+    for size, result in results:
+        print(f"{size:>10}  " + "  ".join(f"{result[column]:>10.2f}" for column in columns[1:]))
+
+
+async def main(args):
+    targets = {"client": bench_client, "coordinator": bench_coordinator}
+    for name in args.targets:
+        results = []
+        for size in args.sizes:
+            results.append((size, await targets[name](size, args.polls, args.latency, args.classic)))
+        report(f"{name} ({'classic' if args.classic else 'rest'}, latency {args.latency * 1000:.0f} ms)", results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="number of outputs")
+    parser.add_argument("--polls", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--classic", action="store_true", help="poll the classic cgi-bin endpoints")
+    parser.add_argument("--targets", nargs="+", choices=["client", "coordinator"], default=["client", "coordinator"])
+    asyncio.run(main(parser.parse_args()))
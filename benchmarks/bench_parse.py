@@ -0,0 +1,131 @@
+"""Compare parsing a status document into dicts with the record parsers.
+
+Reports parse time, peak traced memory and the memory the result keeps for each
+controller size, for the previous paths (json.loads or xmltodict on the whole
+body, then dicts indexed by did) and for parse_status (json.loads into records) or
+XmlStatusParser fed in network sized chunks.
+
+    python -m benchmarks.bench_parse --sizes 10 100 1000
+    python -m benchmarks.bench_parse --xml
+
+The xmltodict comparison needs xmltodict installed.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.fake_apex import FakeApex
+from custom_components.apex.parser import parse_status
+from custom_components.apex.xml_status import XmlStatusParser
+
+CHUNK = 4096
+
+
+def dict_path(raw):
+    data = json.loads(raw.decode())
+    return (
+        {value["did"]: value for value in data["inputs"]},
+        {value["did"]: value for value in data["outputs"]},
+        data["system"],
+        data["feed"],
+    )
+
+
+def record_path(raw):
+    status = parse_status(raw)
+    return (
+        {value.did: value for value in status.inputs},
+        {value.did: value for value in status.outputs},
+        status.system,
+        status.feed,
+    )
+
+
+def xmltodict_path(raw):
+    import xmltodict
+
+    xml = xmltodict.parse(raw.decode())
+    probes = xml["status"]["probes"].get("probe", [])
+    if not isinstance(probes, list):
+        probes = [probes]
+    inputs = {}
+    for value in probes:
+        inputs["base_" + value["name"]] = {
+            "did": "base_" + value["name"],
+            "name": value["name"],
+            "type": value.get("type", "variable"),
+            "value": value["value"].strip(),
+        }
+    outputs = {}
+    for value in xml["status"]["outlets"]["outlet"]:
+        outputs[value["deviceID"]] = {
+            "did": value["deviceID"],
+            "name": value["name"],
+            "status": [value["state"], "", "OK", ""],
+            "ID": value["outputID"],
+            "type": "outlet",
+        }
+    system = {
+        "software": xml["status"]["@software"],
+        "hardware": xml["status"]["@hardware"] + " Legacy Version (Status.xml)",
+    }
+    return inputs, outputs, system
+
+
+def xml_record_path(raw):
+    parser = XmlStatusParser()
+    for start in range(0, len(raw), CHUNK):
+        parser.feed(raw[start:start + CHUNK])
+    status = parser.close()
+    return (
+        {value.did: value for value in status.inputs},
+        {value.did: value for value in status.outputs},
+        status.system,
+    )
+
+
+def measure(path, raw, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        path(raw)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    result = path(raw)
+    kept, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best * 1000, peak / 1024, kept / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="number of outputs")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--padding", type=int, default=0, help="extra bytes of unused data per output")
+    parser.add_argument("--xml", action="store_true", help="compare classic status.xml parsing instead")
+    args = parser.parse_args()
+
+    print(
+        f"{'outputs':>8}  {'KiB':>8}  {'dict ms':>8}  {'peak KiB':>9}  {'kept KiB':>9}"
+        f"  {'record ms':>9}  {'peak KiB':>9}  {'kept KiB':>9}"
+    )
+    for size in args.sizes:
+        fake = FakeApex(outputs=size, padding=args.padding)
+        if args.xml:
+            raw = fake.classic_xml_payload().encode()
+            dict_ms, dict_peak, dict_kept = measure(xmltodict_path, raw, args.repeat)
+            record_ms, record_peak, record_kept = measure(xml_record_path, raw, args.repeat)
+        else:
+            raw = json.dumps(fake.status_payload()).encode()
+            dict_ms, dict_peak, dict_kept = measure(dict_path, raw, args.repeat)
+            record_ms, record_peak, record_kept = measure(record_path, raw, args.repeat)
+        print(
+            f"{size:>8}  {len(raw) / 1024:>8.1f}  {dict_ms:>8.2f}  {dict_peak:>9.1f}  {dict_kept:>9.1f}"
+            f"  {record_ms:>9.2f}  {record_peak:>9.1f}  {record_kept:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
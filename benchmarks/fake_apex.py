@@ -0,0 +1,311 @@
+"""Stand-in Apex controller for exercising the integration without hardware.
+
+Serves the REST endpoints used by newer firmware (/rest/login, /rest/status,
+/rest/config and the output, feed and oconf/pconf/nconf writes) and the classic
+endpoints (/cgi-bin/status.json, /cgi-bin/status.xml, /cgi-bin/status.cgi with
+Basic Auth). Response latency and payload size are configurable, /rest/status and
+/rest/config can answer conditional requests with an ETag.
+
+Run standalone with e.g.
+
+    python -m benchmarks.fake_apex --outputs 100 --latency 0.02 --port 8080
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import secrets
+
+from aiohttp import web
+
+OUTPUT_TYPES = ["outlet", "outlet", "outlet", "variable", "virtual", "dos", "iotaPump|Sicce|Syncra", "vortech", "alert", "24v"]
+# Newer firmware reports a very large remaining time while no feed cycle is running
+FEED_OFF = {"name": 0, "active": 4294967295}
+FEED_SECONDS = 300
+INPUT_TYPES = ["Temp", "pH", "ORP", "Cond", "Amps", "pwr", "volts", "digital"]
+
+
+class FakeApex(object):
+    """In-memory Apex controller state and the aiohttp application serving it."""
+
+    def __init__(
+            self, outputs=10, inputs=None, latency=0.0, padding=0, classic=False,
+            username="admin", password="1234", seed=0, xml_only=False, etag=False
+    ):
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.classic = classic
+        # Early classic firmware has no status.json, only status.xml
+        self.xml_only = xml_only
+        # Send an ETag with /rest/status and /rest/config and answer If-None-Match with 304
+        self.etag = etag
+        self.padding = "x" * padding
+        self.sid = None
+        # Counters the benchmark reads back
+        self.requests = 0
+        self.bytes_sent = 0
+
+        rnd = random.Random(seed)
+        if inputs is None:
+            inputs = max(4, outputs // 2)
+        self.inputs = []
+        for i in range(inputs):
+            itype = INPUT_TYPES[i % len(INPUT_TYPES)]
+            self.inputs.append({
+                "did": f"base_{itype}{i}" if i >= len(INPUT_TYPES) else f"base_{itype}",
+                "type": itype,
+                "name": f"{itype}{i}",
+                "value": round(rnd.uniform(0, 100), 2),
+            })
+        self.outputs = []
+        self.oconf = []
+        for i in range(outputs):
+            otype = OUTPUT_TYPES[i % len(OUTPUT_TYPES)]
+            did = f"{2 + i // 8}_{i % 8 + 1}"
+            status = [rnd.choice(["AON", "AOF", "ON", "OFF"]), "", "OK", ""]
+            if otype == "dos":
+                status = ["AOF", "0", "OK", "", round(rnd.uniform(0, 50), 1)]
+            output = {"did": did, "type": otype, "name": f"Out_{i}", "ID": i, "gid": "", "status": status}
+            if otype == "variable":
+                output["intensity"] = rnd.randint(0, 100)
+            if self.padding:
+                output["pad"] = self.padding
+            self.outputs.append(output)
+            if otype in ("variable", "virtual", "dos"):
+                conf = {"did": did, "name": f"Out_{i}", "ctype": "Advanced", "prog": f"Set {rnd.randint(0, 100)}\nIf Time 08:00 to 20:00 Then ON\n"}
+            else:
+                conf = {"did": did, "name": f"Out_{i}", "ctype": "Auto", "prog": "Fallback OFF\nSet OFF\n" + "If Temp > 80.0 Then ON\n" * 4}
+            self.oconf.append(conf)
+        self.iconf = [
+            {"did": value["did"], "name": value["name"], "extra": {"range": "Faren"} if value["type"] == "Temp" else {}}
+            for value in self.inputs
+        ]
+        self.pconf = [{"ID": i + 1, "name": f"Profile_{i + 1}", "type": "pump", "data": {}} for i in range(32)]
+        self.nconf = {"latestFirmware": "5.12_1A24", "updateFirmware": False}
+        self.feed = dict(FEED_OFF)
+
+    # -- payloads -----------------------------------------------------------------------
+
+    def status_payload(self):
+        return {
+            "system": {"hostname": "FakeApex", "software": "5.12_1A24", "hardware": "1.0", "serial": "AC5:00000"},
+            "inputs": self.inputs,
+            "outputs": self.outputs,
+            "feed": self.feed,
+        }
+
+    def config_payload(self):
+        return {"oconf": self.oconf, "iconf": self.iconf, "pconf": self.pconf, "nconf": self.nconf}
+
+    def classic_json_payload(self):
+        running = self.feed != FEED_OFF
+        feed = {"name": self.feed["name"] if running else 6, "active": self.feed["active"] if running else 0}
+        return {"istat": {
+            "hostname": "FakeApex", "software": "4.53_8C18", "hardware": "1.0", "serial": "AC4:00000",
+            "inputs": self.inputs, "outputs": self.outputs, "feed": feed,
+        }}
+
+    def classic_xml_payload(self):
+        probes = "".join(
+            f"<probe><name>{value['name']}</name><value> {value['value']} </value><type>{value['type']}</type></probe>"
+            for value in self.inputs
+        )
+        outlets = "".join(
+            f"<outlet><name>{value['name']}</name><outputID>{value['ID']}</outputID>"
+            f"<state>{value['status'][0]}</state><deviceID>{value['did']}</deviceID></outlet>"
+            for value in self.outputs
+        )
+        return (
+            '<?xml version="1.0"?><status software="4.53_8C18" hardware="1.0">'
+            f"<hostname>FakeApex</hostname><probes>{probes}</probes><outlets>{outlets}</outlets></status>"
+        )
+
+    def _etag(self, body):
+        return '"' + hashlib.md5(body.encode()).hexdigest() + '"'
+
+    def _find(self, items, did):
+        for item in items:
+            if item["did"] == did:
+                return item
+        return None
+
+    # -- auth ---------------------------------------------------------------------------
+
+    def _basic_ok(self, request):
+        expected = base64.b64encode(f"{self.username}:{self.password}".encode()).decode()
+        return request.headers.get("Authorization") == f"Basic {expected}"
+
+    def _session_ok(self, request):
+        return self.sid is not None and request.headers.get("Cookie") == f"connect.sid={self.sid}"
+
+    def _check_rest(self, request):
+        if not self._session_ok(request):
+            raise web.HTTPUnauthorized()
+
+    def _check_classic(self, request):
+        if not self._basic_ok(request):
+            raise web.HTTPUnauthorized()
+
+    # -- handlers -----------------------------------------------------------------------
+
+    async def login(self, request):
+        if self.classic:
+            raise web.HTTPUnauthorized()
+        body = await request.json()
+        if body.get("login") != self.username or body.get("password") != self.password:
+            raise web.HTTPUnauthorized()
+        self.sid = secrets.token_hex(16)
+        return web.json_response({"connect.sid": self.sid})
+
+    async def root(self, request):
+        self._check_classic(request)
+        return web.Response(text="OK")
+
+    async def status(self, request):
+        self._check_rest(request)
+        if not self.etag:
+            return web.json_response(self.status_payload())
+        body = json.dumps(self.status_payload())
+        tag = self._etag(body)
+        if request.headers.get("If-None-Match") == tag:
+            return web.Response(status=304, headers={"ETag": tag})
+        return web.Response(text=body, content_type="application/json", headers={"ETag": tag})
+
+    async def config(self, request):
+        self._check_rest(request)
+        body = json.dumps(self.config_payload())
+        if not self.etag:
+            return web.Response(text=body, content_type="application/json")
+        tag = self._etag(body)
+        if request.headers.get("If-None-Match") == tag:
+            return web.Response(status=304, headers={"ETag": tag})
+        return web.Response(text=body, content_type="application/json", headers={"ETag": tag})
+
+    async def put_output(self, request):
+        self._check_rest(request)
+        body = await request.json()
+        output = self._find(self.outputs, request.match_info["did"])
+        if output is None:
+            raise web.HTTPNotFound()
+        output["status"] = body["status"]
+        return web.json_response(output)
+
+    async def put_feed(self, request):
+        self._check_rest(request)
+        body = await request.json()
+        # active is 1 to start the named feed cycle and 92 to cancel it
+        self.feed = {"name": int(body["name"]), "active": FEED_SECONDS} if body["active"] == 1 else dict(FEED_OFF)
+        return web.json_response(body)
+
+    async def put_oconf(self, request):
+        self._check_rest(request)
+        body = await request.json()
+        conf = self._find(self.oconf, request.match_info["did"])
+        if conf is None:
+            raise web.HTTPNotFound()
+        conf.update(body)
+        return web.json_response(conf)
+
+    async def put_pconf(self, request):
+        self._check_rest(request)
+        body = await request.json()
+        index = int(request.match_info["id"]) - 1
+        if not 0 <= index < len(self.pconf):
+            raise web.HTTPNotFound()
+        self.pconf[index].update(body)
+        return web.json_response(self.pconf[index])
+
+    async def put_nconf(self, request):
+        self._check_rest(request)
+        self.nconf.update(await request.json())
+        return web.json_response(self.nconf)
+
+    async def classic_status_json(self, request):
+        self._check_classic(request)
+        if self.xml_only:
+            raise web.HTTPNotFound()
+        return web.json_response(self.classic_json_payload())
+
+    async def classic_status_xml(self, request):
+        self._check_classic(request)
+        return web.Response(text=self.classic_xml_payload(), content_type="text/xml")
+
+    async def classic_status_cgi(self, request):
+        self._check_classic(request)
+        form = await request.post()
+        if form.get("FeedCycle") == "Feed":
+            selection = int(form["FeedSel"])
+            self.feed = dict(FEED_OFF) if selection == 5 else {"name": selection + 1, "active": FEED_SECONDS}
+        states = {"0": "AON", "1": "OFF", "2": "ON"}
+        for key, value in form.items():
+            if key.endswith("_state"):
+                name = key[:-len("_state")]
+                for output in self.outputs:
+                    if output["name"] == name:
+                        output["status"][0] = states.get(value, "OFF")
+        return web.Response(text="")
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        response = await handler(request)
+        if response.body is not None:
+            self.bytes_sent += len(response.body)
+        return response
+
+    def make_app(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.add_routes([
+            web.post("/rest/login", self.login),
+            web.post("/", self.root),
+            web.get("/rest/status", self.status),
+            web.get("/rest/config", self.config),
+            web.put("/rest/status/outputs/{did}", self.put_output),
+            web.put("/rest/status/feed/{id}", self.put_feed),
+            web.put("/rest/config/oconf/{did}", self.put_oconf),
+            web.put("/rest/config/pconf/{id}", self.put_pconf),
+            web.put("/rest/config/nconf", self.put_nconf),
+            web.get("/cgi-bin/status.json", self.classic_status_json),
+            web.get("/cgi-bin/status.xml", self.classic_status_xml),
+            web.post("/cgi-bin/status.cgi", self.classic_status_cgi),
+        ])
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start serving and return the bound "host:port" for Apex(deviceip=...)."""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        bound = self._runner.addresses[0]
+        return f"{bound[0]}:{bound[1]}"
+
+    async def stop(self):
+        await self._runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--outputs", type=int, default=10)
+    parser.add_argument("--inputs", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--padding", type=int, default=0, help="extra bytes added to every output")
+    parser.add_argument("--classic", action="store_true", help="emulate Apex Classic (Basic Auth, cgi-bin)")
+    parser.add_argument("--xml-only", action="store_true", help="with --classic, only serve status.xml")
+    parser.add_argument("--etag", action="store_true", help="send ETags with /rest/status and /rest/config")
+    args = parser.parse_args()
+
+    fake = FakeApex(args.outputs, args.inputs, args.latency, args.padding, args.classic, xml_only=args.xml_only, etag=args.etag)
+    print(json.dumps({"outputs": len(fake.outputs), "inputs": len(fake.inputs), "classic": fake.classic}))
+    web.run_app(fake.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
 """The Apex Controller integration."""
 import asyncio
 import logging
+import random
+import time
+from contextlib import asynccontextmanager
 from datetime import timedelta
+from typing import NamedTuple
 
 import async_timeout
 import voluptuous as vol
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
+from homeassistant.util import dt as dt_util
 from homeassistant.helpers.update_coordinator import (
     CoordinatorEntity,
     DataUpdateCoordinator,
@@ -20,9 +25,37 @@ from .const import (
     DEVICEIP,
     MANUFACTURER,
     UPDATE_INTERVAL,
-    UPDATE_INTERVAL_DEFAULT
+    UPDATE_INTERVAL_DEFAULT,
+    CONFIG_INTERVAL,
+    CONFIG_INTERVAL_DEFAULT,
+    MIN_INTERVAL,
+    MIN_INTERVAL_DEFAULT,
+    MAX_INTERVAL,
+    MAX_INTERVAL_DEFAULT,
+    BOOST_DURATION,
+    DATA_SCHEDULER,
+    FLEET_MAX_CONCURRENT,
+    POLL_JITTER,
+    ATTRIBUTE_FIELDS,
+    ATTRIBUTES_DEFAULT,
+    BREAKER_THRESHOLD,
+    BREAKER_BACKOFF_MAX,
+    STATUS_TIMEOUT,
+    CONFIG_TIMEOUT,
+    METRICS,
+    METRICS_DEFAULT,
+    SUBSCRIBE,
+    SUBSCRIBE_DEFAULT,
+    SUBSCRIBE_RETRY,
+    SUBSCRIBE_RETRY_MAX,
+    LAYOUT_REMOVE_POLLS
 )
 from .apex import Apex
+from .breaker import BREAKER_CLOSED, ApexCircuitBreaker
+from .commands import ApexCommandQueue
+from .metrics import ApexMetrics
+from .cache import ApexStatusCache
+from .snapshot import ApexSnapshot
 
 CONFIG_SCHEMA = vol.Schema({DOMAIN: vol.Schema({})}, extra=vol.ALLOW_EXTRA)
 
@@ -34,6 +67,7 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup(hass: HomeAssistant, config: dict):
     """Set up the Apex component."""
     hass.data.setdefault(DOMAIN, {})
+    hass.data.setdefault(DATA_SCHEDULER, ApexPollScheduler())
     return True
 
 
@@ -46,29 +80,57 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         update_interval = entry.options[UPDATE_INTERVAL]
     else:
         update_interval = UPDATE_INTERVAL_DEFAULT
+    config_interval = entry.options.get(CONFIG_INTERVAL, CONFIG_INTERVAL_DEFAULT)
+    min_interval = entry.options.get(MIN_INTERVAL, MIN_INTERVAL_DEFAULT)
+    max_interval = entry.options.get(MAX_INTERVAL, MAX_INTERVAL_DEFAULT)
     _LOGGER.debug(update_interval)
     for ar in entry.data:
         _LOGGER.debug(ar)
 
-    coordinator = ApexDataUpdateCoordinator(hass, user, password, deviceip, update_interval)
+    scheduler = hass.data.setdefault(DATA_SCHEDULER, ApexPollScheduler())
+    cache = ApexStatusCache(hass, entry.entry_id)
+    coordinator = ApexDataUpdateCoordinator(
+        hass, user, password, deviceip, update_interval, config_interval, scheduler,
+        min_interval, max_interval, cache, entry.options.get(METRICS, METRICS_DEFAULT)
+    )
 
-    await coordinator.async_refresh()  # Get initial data
+    cached = await cache.async_load()
+    if cached is None:
+        await coordinator.async_refresh()  # Get initial data
 
-    if not coordinator.last_update_success:
-        raise ConfigEntryNotReady
+        if not coordinator.last_update_success:
+            scheduler.unregister(coordinator)
+            await coordinator.apex.close()
+            raise ConfigEntryNotReady
+    else:
+        # Create the entities with their cached state and let the first poll finish in
+        # the background.
+        coordinator.async_restore(*cached)
+        entry.async_create_background_task(
+            hass, coordinator.async_refresh(), f"{DOMAIN} first refresh {deviceip}"
+        )
 
     hass.data[DOMAIN][entry.entry_id] = coordinator
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    if entry.options.get(SUBSCRIBE, SUBSCRIBE_DEFAULT):
+        # Cancelled when the entry is unloaded
+        entry.async_create_background_task(
+            hass, coordinator.async_subscribe(), f"{DOMAIN} subscription {deviceip}"
+        )
+
     async def async_set_options_service(service_call):
-        await hass.async_add_executor_job(set_output, hass, service_call, coordinator)
+        await set_output(hass, service_call, coordinator)
+
+    async def async_set_outputs_service(service_call):
+        await set_outputs(hass, service_call, coordinator)
 
     async def async_set_variable_service(service_call):
-        await hass.async_add_executor_job(set_variable, hass, service_call, coordinator)
+        await set_variable(hass, service_call, coordinator)
 
     async def async_set_dos_rate_service(service_call):
-        await hass.async_add_executor_job(set_dos_rate, hass, service_call, coordinator)
+        await set_dos_rate(hass, service_call, coordinator)
 
     hass.services.async_register(
         DOMAIN,
@@ -76,6 +138,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
         async_set_options_service
     )
 
+    hass.services.async_register(
+        DOMAIN,
+        "set_outputs",
+        async_set_outputs_service
+    )
+
     hass.services.async_register(
         DOMAIN,
         "set_variable",
@@ -91,27 +159,42 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     return True
 
 
-def set_output(hass, service, coordinator):
+async def set_output(hass, service, coordinator):
     did = service.data.get("did").strip()
     setting = service.data.get("setting").strip()
-    coordinator.apex.toggle_output(did, setting)
+    await coordinator.commands.async_output(did, setting)
 
 
-def set_variable(hass, service, coordinator):
+async def set_outputs(hass, service, coordinator):
+    outputs = [
+        (output["did"].strip(), output["setting"].strip())
+        for output in service.data.get("outputs")
+    ]
+    # Queued like switch commands so they are sent in order with them, the queue
+    # refreshes once after the batch
+    results = await coordinator.commands.async_outputs(outputs)
+    failed = [did for (did, _), result in zip(outputs, results) if isinstance(result, Exception)]
+    if failed:
+        raise HomeAssistantError(f"Failed to set outputs: {', '.join(failed)}")
+
+
+async def set_variable(hass, service, coordinator):
     did = service.data.get("did").strip()
     code = service.data.get("code")
-    status = coordinator.apex.set_variable(did, code)
+    status = await coordinator.apex.set_variable(did, code)
     if status["error"] != "":
         raise HomeAssistantError(status["error"])
+    await coordinator.async_boost()
 
 
-def set_dos_rate(hass, service, coordinator):
+async def set_dos_rate(hass, service, coordinator):
     did = service.data.get("did").strip()
     profile_id = int(service.data.get("profile_id"))
     rate = float(service.data.get("rate"))
-    status = coordinator.apex.set_dos_rate(did, profile_id, rate)
+    status = await coordinator.apex.set_dos_rate(did, profile_id, rate)
     if status["error"] != "":
         raise HomeAssistantError(status["error"])
+    await coordinator.async_boost()
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
@@ -125,55 +208,407 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
         )
     )
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await coordinator.commands.async_shutdown()
+        coordinator.scheduler.unregister(coordinator)
+        await coordinator.apex.close()
 
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Remove the cached status of a deleted config entry."""
+    await ApexStatusCache(hass, entry.entry_id).async_remove()
+
+
+class ApexPollScheduler(object):
+    """Domain wide scheduler shared by the coordinators of all Apex controllers.
+
+    Each controller gets a phase offset for its first poll so controllers set up
+    together don't poll together, every following interval is jittered, and at most
+    max_concurrent polls are in flight across all controllers.
+    """
+
+    def __init__(self, max_concurrent=FLEET_MAX_CONCURRENT, jitter=POLL_JITTER):
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._jitter = jitter
+        self._registered = 0
+        self.timings = {}
+
+    def register(self, coordinator, interval):
+        """Register a controller and return the extra delay before its first scheduled poll."""
+        # Golden ratio steps spread any number of controllers evenly over the interval
+        phase = (self._registered * 0.618033988749895) % 1 * interval.total_seconds()
+        self._registered += 1
+        self.timings[coordinator.deviceip] = {
+            "phase": round(phase, 3),
+            "interval": None,
+            "last_poll": None,
+            "wait": None,
+            "duration": None,
+        }
+        return timedelta(seconds=phase)
+
+    def unregister(self, coordinator):
+        self.timings.pop(coordinator.deviceip, None)
+
+    def next_interval(self, coordinator, interval):
+        """Return the jittered delay until the controller's next poll."""
+        seconds = interval.total_seconds() * (1 + random.uniform(-self._jitter, self._jitter))
+        if coordinator.deviceip in self.timings:
+            self.timings[coordinator.deviceip]["interval"] = round(seconds, 3)
+        return timedelta(seconds=seconds)
+
+    @asynccontextmanager
+    async def slot(self, coordinator):
+        """Wait for a free poll slot and record how long the poll took."""
+        queued = time.monotonic()
+        async with self._semaphore:
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                timing = self.timings.get(coordinator.deviceip)
+                if timing is not None:
+                    timing["last_poll"] = dt_util.utcnow().isoformat()
+                    timing["wait"] = round(started - queued, 3)
+                    timing["duration"] = round(time.monotonic() - started, 3)
+
+
 class ApexDataUpdateCoordinator(DataUpdateCoordinator):
     """DataUpdateCoordinator to handle fetching new data about the Apex Controller."""
 
-    def __init__(self, hass, user, password, deviceip, update_interval):
+    def __init__(
+            self, hass, user, password, deviceip, update_interval, config_interval, scheduler=None,
+            min_interval=MIN_INTERVAL_DEFAULT, max_interval=MAX_INTERVAL_DEFAULT, cache=None,
+            metrics=METRICS_DEFAULT
+    ):
         """Initialize the coordinator and set up the Controller object."""
         self._hass = hass
         self.deviceip = deviceip
-        self.apex = Apex(user, password, deviceip)
+        self.scheduler = scheduler if scheduler is not None else ApexPollScheduler()
+        self.poll_interval = timedelta(seconds=update_interval)
+        self._phase = self.scheduler.register(self, self.poll_interval)
+        # Polling speeds up to min_interval after a command or while a feed cycle runs and
+        # backs off towards max_interval while nothing changes.
+        self.min_interval = timedelta(seconds=min(min_interval, update_interval))
+        self.max_interval = timedelta(seconds=max(max_interval, update_interval))
+        self._interval = self.poll_interval
+        self._boost_until = 0
+        # Keys (dids, "feed", "system", "nconf") that changed in the last refresh, None
+        # when every entity has to write its state
+        self.changed = None
+        # Keys of entities that wrote a state the controller has not confirmed yet, added
+        # to changed by the next refresh so those entities write the polled state
+        self._dirty = set()
+        # Input and output dids entities exist for. A did only leaves the layout after
+        # it was missing from LAYOUT_REMOVE_POLLS polls in a row. Platforms listen for
+        # changes to add and remove entities.
+        self.layout = None
+        self._layout_data = None
+        self._missing = {}
+        self._layout_listeners = []
+        # Request and poll phase metrics, None unless enabled in the options
+        self.metrics = ApexMetrics() if metrics else None
+        self.apex = Apex(user, password, deviceip, metrics=self.metrics)
+        # Switch and set_output commands go through this queue so rapid toggles of the
+        # same output only send the final state to the controller.
+        self.commands = ApexCommandQueue(self.apex, on_flush=self._async_commands_sent)
         self._available = True
+        # /rest/config rarely changes, so it is only re-fetched every config_interval
+        # seconds or when invalidated, e.g. by a firmware update.
+        self.config_interval = config_interval
+        self._config = {}
+        self._config_fetched = None
+        self._config_failures = 0
+        # Optional ApexStatusCache saved after every successful poll
+        self.cache = cache
+        self.breaker = ApexCircuitBreaker(
+            BREAKER_THRESHOLD, update_interval, max(BREAKER_BACKOFF_MAX, update_interval)
+        )
 
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(seconds=update_interval),
+            update_interval=self.poll_interval,
         )
 
     async def _async_update_data(self):
         """Fetch data from Apex Controller."""
+        if self.breaker.is_open:
+            # Check the controller answers at all before polling it again
+            reachable = await self.apex.probe()
+            self.breaker.record_probe(reachable)
+            if not reachable:
+                self._schedule_next(timedelta(seconds=self.breaker.retry_in))
+                raise UpdateFailed(f"Apex at {self.deviceip} is still unreachable")
+        self._schedule_next(self.poll_interval)
+        metrics = self.metrics
+        config_task = None
         try:
-            async with async_timeout.timeout(30):
-                data = await self._hass.async_add_executor_job(
-                    self.apex.status  # Fetch new status
-                )
-
-                data["config"] = await self._hass.async_add_executor_job(
-                    self.apex.config  # Fetch new status
-                )
+            async with self.scheduler.slot(self):
+                started = time.perf_counter()
+                if self._config_due():
+                    # Fetch new config alongside the status rather than after it
+                    config_task = asyncio.create_task(self._async_fetch_config())
+                async with async_timeout.timeout(STATUS_TIMEOUT):
+                    data = await self.apex.status()  # Fetch new status
+                if data is None:
+                    raise ValueError("Apex returned no status")
+                if config_task is not None:
+                    await config_task
+
+                # Writes through the client keep its config cache current between fetches
+                if self.apex.config_cache is not None:
+                    self._config = self.apex.config_cache
                 # _LOGGER.debug("Refreshing Now")
                 # _LOGGER.debug(data)
-
-                return data
+                fetched = time.perf_counter()
+
+                snapshot = ApexSnapshot(data, self._config, self.data)
+                if self.data is not None and self.last_update_success:
+                    self.changed = snapshot.changes(self.data)
+                else:
+                    self.changed = None
+                if metrics is not None:
+                    indexed = time.perf_counter()
+                    metrics.record_phase("fetch", fetched - started)
+                    metrics.record_phase("index", indexed - fetched)
+                    metrics.record_phase("poll", indexed - started)
+                if self.cache is not None:
+                    self.cache.async_save(snapshot)
+                self._schedule_next(self._adaptive_interval(snapshot))
+                # Only shift the schedule once, by the interval that is actually used
+                self._phase = timedelta(0)
+                self._merge_dirty()
         except Exception as ex:
+            if config_task is not None and not config_task.done():
+                config_task.cancel()
             self._available = False  # Mark as unavailable
-            _LOGGER.warning(str(ex))
-            _LOGGER.warning("Error communicating with Apex for %s", self.deviceip)
+            self.changed = None
+            if self.breaker.record_failure(ex):
+                _LOGGER.warning(
+                    "Apex at %s failed %d polls in a row (%s), probing it every %d+ seconds until it answers",
+                    self.deviceip, self.breaker.failures, self.breaker.last_error, self.breaker.retry_in
+                )
+            else:
+                _LOGGER.debug("Error communicating with Apex for %s: %r", self.deviceip, ex)
+            if self.breaker.is_open:
+                self._schedule_next(timedelta(seconds=self.breaker.retry_in))
             raise UpdateFailed(
                 f"Error communicating with Apex for {self.deviceip}"
             ) from ex
+        if self.breaker.record_success():
+            _LOGGER.info("Apex at %s is reachable again", self.deviceip)
+        return snapshot
+
+    async def _async_fetch_config(self):
+        """Fetch the controller config, keeping the last one if that fails."""
+        try:
+            async with async_timeout.timeout(CONFIG_TIMEOUT):
+                config = await self.apex.config()
+            if config is None:
+                raise ValueError("Apex returned no config")
+        except Exception as ex:
+            self._config_failures += 1
+            # Retried on every poll until it succeeds, so only the first failure is a warning
+            log = _LOGGER.warning if self._config_failures == 1 else _LOGGER.debug
+            log("Fetching the config of Apex at %s failed, keeping the last one: %r", self.deviceip, ex)
+            return
+        self._config_failures = 0
+        self._config_fetched = time.monotonic()
+
+    async def async_subscribe(self):
+        """Poll the status every min_interval seconds and apply changes until cancelled.
+
+        Regular polls keep running alongside to refresh the config and detect outages,
+        the subscription waits while the last poll failed.
+        """
+        retry = SUBSCRIBE_RETRY
+        while True:
+            if not self.last_update_success or self.breaker.state != BREAKER_CLOSED:
+                await asyncio.sleep(self.poll_interval.total_seconds())
+                continue
+            try:
+                async for status in self.apex.subscribe(interval=self.min_interval.total_seconds()):
+                    self._async_push(status)
+                    retry = SUBSCRIBE_RETRY
+            except Exception as ex:
+                _LOGGER.debug(
+                    "Subscription to Apex at %s failed, retrying in %d seconds: %r", self.deviceip, retry, ex
+                )
+            await asyncio.sleep(retry)
+            retry = min(retry * 2, SUBSCRIBE_RETRY_MAX)
+
+    @callback
+    def _async_push(self, status):
+        """Update entities from a pushed status if anything in it changed."""
+        if self.data is None or not self.last_update_success:
+            return
+        if self.apex.config_cache is not None:
+            self._config = self.apex.config_cache
+        snapshot = ApexSnapshot(status, self._config, self.data)
+        changed = snapshot.changes(self.data)
+        if not changed and not self._dirty:
+            return
+        self.changed = changed
+        self._merge_dirty()
+        if self.cache is not None:
+            self.cache.async_save(snapshot)
+        # Not async_set_updated_data, which would push the next regular poll back on
+        # every change and keep the config from being refreshed
+        self.data = snapshot
+        self.async_update_listeners()
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Update all entities, timing it when metrics are enabled."""
+        if self.metrics is None:
+            self._async_check_layout()
+            super().async_update_listeners()
+            return
+        started = time.perf_counter()
+        self._async_check_layout()
+        super().async_update_listeners()
+        self.metrics.record_phase("dispatch", time.perf_counter() - started)
+
+    @callback
+    def async_add_layout_listener(self, update_callback):
+        """Call update_callback when inputs or outputs were added or removed.
+
+        Returns a function to stop.
+        """
+        self._layout_listeners.append(update_callback)
+        return lambda: self._layout_listeners.remove(update_callback)
+
+    @callback
+    def _async_check_layout(self):
+        data = self.data
+        if data is None or data is self._layout_data or not self.last_update_success:
+            return
+        previous, self._layout_data = self._layout_data, data
+        if not data.inputs and not data.outputs:
+            # A rebooting controller may briefly report no inputs and outputs at all
+            return
+        if self.layout is None:
+            self.layout = {*data.inputs, *data.outputs}
+            return
+        if (
+            not self._missing and previous is not None
+            and previous.inputs.keys() == data.inputs.keys()
+            and previous.outputs.keys() == data.outputs.keys()
+        ):
+            return
+
+        added = False
+        for did in (*data.inputs, *data.outputs):
+            self._missing.pop(did, None)
+            if did not in self.layout:
+                self.layout.add(did)
+                added = True
+        removed = False
+        for did in self.layout:
+            if did in data.inputs or did in data.outputs:
+                continue
+            self._missing[did] = self._missing.get(did, 0) + 1
+            if self._missing[did] >= LAYOUT_REMOVE_POLLS:
+                removed = True
+        if removed:
+            for did in [did for did, polls in self._missing.items() if polls >= LAYOUT_REMOVE_POLLS]:
+                self.layout.discard(did)
+                del self._missing[did]
+        if not (added or removed):
+            return
+        _LOGGER.debug("Layout of Apex at %s changed", self.deviceip)
+        for update_callback in list(self._layout_listeners):
+            update_callback()
+
+    def async_restore(self, status, config):
+        """Start from cached data until the first poll completes, showing its state."""
+        self._config = config
+        self.data = ApexSnapshot(status, config)
+        self._layout_data = self.data
+        self.layout = {*self.data.inputs, *self.data.outputs} or None
+        self.last_update_success = True
+
+    def _schedule_next(self, interval):
+        """Set the jittered delay until the next poll."""
+        # The phase offset delays the poll after the first successful one, see below
+        self.update_interval = self.scheduler.next_interval(self, interval) + self._phase
+
+    def _adaptive_interval(self, snapshot):
+        """Return the base interval until the next poll based on recent activity."""
+        changed = self.changed is None or not self.changed <= {"system", "nconf"}
+        if time.monotonic() < self._boost_until or snapshot.feed_active:
+            self._interval = self.min_interval
+        elif not changed:
+            self._interval = min(self._interval * 2, self.max_interval)
+        else:
+            self._interval = self.poll_interval
+        return self._interval
+
+    async def async_boost(self):
+        """Poll at min_interval for a while after a command, starting with a refresh now."""
+        self._boost_until = time.monotonic() + BOOST_DURATION
+        await self.async_request_refresh()
+
+    @callback
+    def _async_commands_sent(self):
+        # Refresh without holding up the command queue until the poll has finished
+        self.hass.async_create_task(self.async_boost())
+
+    @callback
+    def async_mark_dirty(self, keys):
+        """Have entities depending on keys write their state after the next refresh."""
+        self._dirty.update(keys)
+
+    def _merge_dirty(self):
+        if self._dirty:
+            if self.changed is not None:
+                self.changed = self.changed | self._dirty
+            self._dirty = set()
+
+    def has_changed(self, keys):
+        """Return True if an entity depending on keys has to write its state."""
+        return self.changed is None or keys is None or not self.changed.isdisjoint(keys)
+
+    @property
+    def poll_timing(self):
+        """Return when this controller was last polled and how long it took."""
+        return self.scheduler.timings.get(self.deviceip, {})
+
+    def _config_due(self):
+        """Return True when the cached controller config should be re-fetched."""
+        if self._config_fetched is None or self.apex.config_cache is None:
+            return True
+        return time.monotonic() - self._config_fetched >= self.config_interval
+
+    def invalidate_config(self):
+        """Re-fetch the controller config on the next refresh, e.g. after a write."""
+        self._config_fetched = None
+
+
+class ApexEntityInfo(NamedTuple):
+    """The input, output or virtual device an entity represents."""
+
+    did: str
+    type: str
+    name: str
+
+    @classmethod
+    def from_record(cls, record):
+        """Build from an ApexInput or ApexOutput record."""
+        return cls(record.did, record.type, record.name)
 
 
 class ApexEntity(CoordinatorEntity):
     """Defines a base Apex entity."""
 
+    # Advanced programs can be long and are kept out of the recorder database
+    _unrecorded_attributes = frozenset({"prog"})
+    attribute_profile = ATTRIBUTES_DEFAULT
+
     def __init__(
             self, *, device_id: str, name: str, coordinator: ApexDataUpdateCoordinator
     ):
@@ -182,11 +617,27 @@ class ApexEntity(CoordinatorEntity):
         self._device_id = device_id
         self._name = name
 
-    async def async_added_to_hass(self) -> None:
-        """When entity is added to hass."""
-        await super().async_added_to_hass()
-        self._handle_coordinator_update()
+    @property
+    def update_keys(self):
+        """Return the coordinator change keys this entity depends on, None for all."""
+        return None
 
+    def _state_attributes(self, record):
+        """Return the attributes the attribute profile keeps of a record or config dict."""
+        if record is None:
+            return None
+        if isinstance(record, tuple):
+            record = record._asdict()
+        fields = ATTRIBUTE_FIELDS.get(self.attribute_profile)
+        if fields is None:
+            return dict(record)
+        return {field: record[field] for field in fields if record.get(field) is not None}
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Only write state when something this entity shows has changed."""
+        if self.coordinator.has_changed(self.update_keys):
+            super()._handle_coordinator_update()
 
     @property
     def name(self):
@@ -208,7 +659,56 @@ class ApexEntity(CoordinatorEntity):
         return {
             "identifiers": {(DOMAIN, self.coordinator.deviceip)},
             "name": f"Apex Controller ({self.coordinator.deviceip})",
-            "hw_version": self.coordinator.data["system"]["hardware"],
-            "sw_version": self.coordinator.data["system"]["software"],
+            "hw_version": self.coordinator.data.system.hardware,
+            "sw_version": self.coordinator.data.system.software,
             "manufacturer": MANUFACTURER
         }
+
+
+class ApexLayoutTracker(object):
+    """Keep the entities one platform creates for inputs and outputs in step with the layout.
+
+    inputs and outputs build the entity of an ApexInput or ApexOutput record, or return
+    None if the record gets no entity on this platform. Entities of new dids are added
+    in one batch. Entities of dids that left the coordinator layout are removed, their
+    entity registry entries are kept so renames and areas return with the did.
+    """
+
+    def __init__(self, hass, coordinator, async_add_entities, inputs=None, outputs=None):
+        self.hass = hass
+        self.coordinator = coordinator
+        self._async_add_entities = async_add_entities
+        self._builders = ((inputs, "inputs"), (outputs, "outputs"))
+        # Entity of each known did, None where the record has no entity here
+        self.entities = {}
+
+    def build(self):
+        """Return entities for the dids in the coordinator data not known yet."""
+        data = self.coordinator.data
+        new = []
+        for build, section in self._builders:
+            if build is None:
+                continue
+            for did, record in getattr(data, section).items():
+                if did in self.entities:
+                    continue
+                entity = self.entities[did] = build(record)
+                if entity is not None:
+                    new.append(entity)
+        return new
+
+    @callback
+    def async_update(self):
+        """Add and remove entities after the layout changed."""
+        new = self.build()
+        if new:
+            _LOGGER.debug("Adding %d entities for new Apex inputs and outputs", len(new))
+            self._async_add_entities(new)
+
+        layout = self.coordinator.layout
+        for did in [did for did in self.entities if did not in layout]:
+            entity = self.entities.pop(did)
+            if entity is None:
+                continue
+            _LOGGER.debug("Removing %s, its did %s is gone from the controller", entity.entity_id, did)
+            self.hass.async_create_task(entity.async_remove())
@@ -1,234 +1,352 @@
+import asyncio
+import hashlib
+import json
 import logging
-import requests
 import time
-import xmltodict
-import base64
-import json
+from contextlib import asynccontextmanager
+
+import aiohttp
+
+from .auth import ApexAuth, ApexAuthError
+from .parser import parse_status
 
 defaultHeaders = {
     "Accept": "*/*",
     "Content-Type": "application/json"
 }
 
+# The controller runs a small embedded web server, so keep a few sockets open to it and
+# reuse them for every poll and command rather than reconnecting each time.
+MAX_CONNECTIONS = 3
+KEEPALIVE_TIMEOUT = 75
+# Every request gives up on an unreachable or stalled controller after these many seconds
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=30, connect=5, sock_read=15)
+PROBE_TIMEOUT = aiohttp.ClientTimeout(total=5)
+# Subscriptions poll the status every SUBSCRIBE_INTERVAL seconds, or the interval the
+# caller passes
+SUBSCRIBE_INTERVAL = 5
+# Config writes PUT whole entries, so the cached entry they start from is revalidated
+# against the controller once it is older than this many seconds. Otherwise an edit
+# made in Fusion since the last fetch would be silently overwritten.
+CONFIG_WRITE_MAX_AGE = 10
+
 _LOGGER = logging.getLogger(__name__)
 
 
 class Apex(object):
+    """Async client for the Apex REST and classic CGI interfaces."""
+
     def __init__(
-            self, username, password, deviceip
+            self, username, password, deviceip, session: aiohttp.ClientSession | None = None,
+            metrics=None
     ):
 
         self.username = username
         self.password = password
         self.deviceip = deviceip
-        self.sid = None
-        self.version = "new"
         self.did_map = {}
-
-    def auth(self):
-        headers = {**defaultHeaders}
-        data = {"login": self.username, "password": self.password, "remember_me": False}
-        login_attempt = 0
-
-        while login_attempt < 3:
-            r = requests.post(f"http://{self.deviceip}/rest/login", headers=headers, json=data)
-
-            _LOGGER.debug(f"Attempt {login_attempt + 1}: Sending POST request to http://{self.deviceip}/rest/login")
-            _LOGGER.debug(f"Response status code: {r.status_code}")
-            # _LOGGER.debug(f"Response body: {r.text}")
-
-            if r.status_code == 200:
-                self.sid = r.json().get("connect.sid", None)
-                if self.sid:
-                    _LOGGER.debug(f"Successfully authenticated with session. Session ID: {self.sid}")
-                    return True
-                else:
-                    _LOGGER.error("Session ID missing in the response.")
-            elif r.status_code == 404:
-                self.version = "old"
-                _LOGGER.info("Detected old version of the device software.")
+        # Logins are shared by every request to this controller
+        self._auth = ApexAuth(lambda: self.session, username, password, deviceip, REQUEST_TIMEOUT)
+        # Last /rest/config document, reused by the config writes below
+        self.config_cache = None
+        # Validators and body digest of config_cache, and how often a fetch found it unchanged
+        self._config_validators = {}
+        self._config_digest = None
+        self.config_unchanged = 0
+        # Set once classic firmware answered status.json with 404, it only serves status.xml
+        self._status_xml = False
+        # When config_cache was last confirmed by the controller, as time.monotonic()
+        self._config_checked = None
+        self._session = session
+        self._owns_session = session is None
+        # Optional ApexMetrics recording every request
+        self.metrics = metrics
+
+    @property
+    def version(self):
+        """Return "old" for Apex Classic firmware, known once logged in."""
+        return "old" if self._auth.classic else "new"
+
+    @property
+    def sid(self):
+        return self._auth.sid
+
+    @property
+    def logins(self):
+        """Return how many times this client has logged in."""
+        return self._auth.logins
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Return the pooled session for this controller, creating it on first use."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=MAX_CONNECTIONS,
+                limit_per_host=MAX_CONNECTIONS,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=defaultHeaders,
+                cookie_jar=aiohttp.DummyCookieJar(),
+            )
+            self._owns_session = True
+        return self._session
+
+    async def close(self):
+        """Close the pooled session if this client created it."""
+        if self._owns_session and self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    def _request(self, method, path, headers=None, timeout=REQUEST_TIMEOUT, **kwargs):
+        """Send a request to the controller with the shared auth headers applied."""
+        return self.session.request(
+            method,
+            f"http://{self.deviceip}{path}",
+            headers={**self._auth.headers, **(headers or {})},
+            timeout=timeout,
+            **kwargs,
+        )
+
+    @asynccontextmanager
+    async def _authed_request(self, method, path, headers=None, metric=None, **kwargs):
+        """Send a request, logging in first if needed and once more if it is rejected.
+
+        A rejected request waits for the login of whichever concurrent request saw the
+        rejection first, so an expired session costs one login. Metrics are recorded
+        under metric if given, otherwise under the endpoint of path.
+        """
+        started = time.monotonic()
+        r = None
+        ok = False
+        try:
+            generation = await self._auth.async_valid()
+            async with self._request(method, path, headers, **kwargs) as r:
+                if r.status != 401:
+                    yield r
+                    ok = r.ok
+                    return
+            if self.metrics is not None:
+                self.metrics.retries += 1
+            if not await self._auth.async_login(generation):
+                raise ApexAuthError(f"Unable to log in to Apex at {self.deviceip}")
+            async with self._request(method, path, headers, **kwargs) as r:
+                yield r
+                ok = r.ok
+        finally:
+            # Measured until the caller has read the body, so parsing is included
+            if self.metrics is not None:
+                self.metrics.record_request(
+                    metric or path, time.monotonic() - started, r.content.total_bytes if r is not None else None, ok
+                )
+
+    async def probe(self):
+        """Return True if the controller answers HTTP at all, without logging in."""
+        try:
+            async with self._request("HEAD", "/", timeout=PROBE_TIMEOUT):
                 return True
-            elif r.status_code != 401:
-                _LOGGER.warning(f"Unexpected status code: {r.status_code}")
-            else:
-                _LOGGER.info(f"Basic Auth attempt because of 401 error")
-                # Basic Auth fallback
-                basic_auth_header = base64.b64encode(f"{self.username}:{self.password}".encode()).decode('utf-8')
-                headers['Authorization'] = f"Basic {basic_auth_header}"
-                r = requests.post(f"http://{self.deviceip}/", headers=headers)
-
-                _LOGGER.debug(f"Basic Auth Response status code: {r.status_code}")
-                # _LOGGER.debug(f"Basic Auth Response body: {r.text}")
-
-                if r.status_code == 200:
-                    self.version = "old"
-                    self.sid = f"Basic {basic_auth_header}"
-                    _LOGGER.info("Successfully authenticated using Basic Auth.")
-                    _LOGGER.debug(f"Basic Auth SID: {self.sid}")
-                    return True
-                else:
-                    _LOGGER.error("Failed to authenticate using both methods.")
-
-            login_attempt += 1
-            if login_attempt < 3:
-                _LOGGER.info(f"Retrying authentication... Attempt #{login_attempt + 1}")
-
-        _LOGGER.error("Authentication failed after 3 attempts.")
-        return False
-
-
-    def oldstatus(self):
-        headers = {**defaultHeaders}
-        headers['Authorization'] = self.sid
-
-        r = requests.get(f"http://{self.deviceip}/cgi-bin/status.xml?" + str(round(time.time())), headers=headers)
-        _LOGGER.debug(f"oldstatus: Response status code: {r.status_code}")
-        # _LOGGER.debug(f"oldstatus: Response body: {r.text}")
-
-        xml = xmltodict.parse(r.text)
-        # _LOGGER.debug("oldstatus: XML parsed successfully")
-
-        result = {}
-        system = {}
-        system["software"] = xml["status"]["@software"]
-        system["hardware"] = xml["status"]["@hardware"] + " Legacy Version (Status.xml)"
-        result["system"] = system
-        # _LOGGER.debug(f"oldstatus: system: {system}")
-
-        inputs = []
-        # Ensure the 'probe' key exists and is a list
-        probes = xml["status"]["probes"].get("probe", [])
-        if not isinstance(probes, list):
-            probes = [probes]  # Make it a single-item list if it's not a list
-
-        for value in probes:
-            inputdata = {}
-            inputdata["did"] = "base_" + value["name"]
-            inputdata["name"] = value["name"]
-            # Using get to provide a default value of 'variable' if 'type' is not found
-            inputdata["type"] = value.get("type", "variable")
-            inputdata["value"] = value["value"].strip()  # Also stripping any whitespace from the value
-            inputs.append(inputdata)
-
-        result["inputs"] = inputs
-        # _LOGGER.debug(f"oldstatus: inputs: {inputs}")
-
-        outputs = []
-        for value in xml["status"]["outlets"]["outlet"]:
-            outputdata = {}
-            outputdata["did"] = value["deviceID"]
-            outputdata["name"] = value["name"]
-            outputdata["status"] = [value["state"], "", "OK", ""]
-            outputdata["id"] = value["outputID"]
-            outputdata["type"] = "outlet"
-            outputs.append(outputdata)
-            self.did_map[value["deviceID"]] = value["name"]
-
-        result["outputs"] = outputs
-        # _LOGGER.debug(f"oldstatus: outputs: {outputs}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+            _LOGGER.debug(f"probe: {self.deviceip} unreachable: {err!r}")
+            return False
+
+    async def auth(self):
+        """Log in now, e.g. to check the credentials. Returns True on success."""
+        return await self._auth.async_login()
+
+    def _patch_cached_config(self, section, item, update):
+        """Swap a cached config entry for its updated copy after a successful write.
+
+        The entry and the document holding it are copied rather than modified, so
+        snapshots built from the previous config still hold the old value and an
+        unchanged document is always the same object.
+        """
+        items = self.config_cache.get(section, []) if self.config_cache is not None else []
+        for index, value in enumerate(items):
+            if value is item:
+                items = list(items)
+                items[index] = update
+                self.config_cache = {**self.config_cache, section: items}
+                # The cache no longer matches what the controller last sent
+                self._config_validators = {}
+                self._config_digest = None
+                return
+
+    async def oldstatus(self):
+        from .xml_status import XmlStatusParser
+
+        async with self._authed_request("GET", "/cgi-bin/status.xml?" + str(round(time.time()))) as r:
+            _LOGGER.debug(f"oldstatus: Response status code: {r.status}")
+            if r.status != 200:
+                _LOGGER.debug("oldstatus: Unknown error occurred")
+                return None
+            parser = XmlStatusParser()
+            async for chunk in r.content.iter_any():
+                parser.feed(chunk)
+            result = parser.close()
+
+        for output in result.outputs:
+            self.did_map[output.did] = output.name
 
         _LOGGER.debug(f"oldstatus result: {result}")
         return result
 
-    def oldstatus_json(self):
-        i = 0
-        while i <= 3:
-            headers = {**defaultHeaders}
-            headers['Authorization'] = self.sid
+    async def _read_status(self, r, classic=False):
+        """Read a status response body and parse it into an ApexStatus."""
+        raw = await r.read()
+        if self.metrics is None:
+            return parse_status(raw, classic)
 
-            r = requests.get(f"http://{self.deviceip}/cgi-bin/status.json?" + str(round(time.time())), headers=headers)
-            # _LOGGER.debug(f"oldstatus_json: Response status code: {r.status_code}")
-            # _LOGGER.debug(f"oldstatus_json: Response body: {r.text}")
-
-            if r.status_code == 200:
-                json_in = r.json()
-                # _LOGGER.debug(f"oldstatus_json: json_in: {json_in}")
-
-                # data comes in istat so move it to root of results
-                result = json_in["istat"];
+        started = time.perf_counter()
+        result = parse_status(raw, classic)
+        self.metrics.record_phase("parse", time.perf_counter() - started)
+        return result
 
-                # generate system info
-                system = {}
-                system["software"] = result["software"]
-                system["hardware"] = result["hostname"] + " " + result["hardware"] + " " + result["serial"]
-                result["system"] = system
-                # _LOGGER.debug(f"oldstatus_json: system: {system}")
+    async def oldstatus_json(self):
+        async with self._authed_request("GET", "/cgi-bin/status.json?" + str(round(time.time()))) as r:
+            # _LOGGER.debug(f"oldstatus_json: Response status code: {r.status}")
 
-                # Add Apex type for Feed Calculation
-                result["feed"]["apex_type"] = "old"
+            if r.status == 200:
+                # data comes in istat, the parser lifts it to the root and builds the system info
+                result = await self._read_status(r, classic=True)
 
                 # Parse outputs to get name for map (for toggle)
-                outputs = result["outputs"]
-                for output in outputs:
-                    did = output["did"]
-                    name = output["name"]
-                    self.did_map[did] = name
+                for output in result.outputs:
+                    self.did_map[output.did] = output.name
                 # _LOGGER.debug(f"oldstatus_json: did_map: {self.did_map}")
 
                 #_LOGGER.debug(f"oldstatus_json result: {result}")
                 return result
-            elif r.status_code == 401:
-                self.auth()
-            else:
-                _LOGGER.debug("oldstatus_json: Unknown error occurred")
-                return {}
-            i += 1
-
+            if r.status == 404:
+                # Older classic firmware only serves status.xml, so later polls go there directly
+                self._status_xml = True
+            _LOGGER.debug(f"oldstatus_json: Unknown error occurred ({r.status})")
+            return None
 
-
-    def status(self):
+    async def status(self):
+        # Log in first, the firmware version decides which status endpoint to use
+        await self._auth.async_valid()
 
         _LOGGER.debug(f"status grab for {self.version}: sid[{self.sid}]")
 
-        if self.sid is None:
-            _LOGGER.debug("We are none")
-            self.auth()
-
         if self.version == "old":
-            # result = self.oldstatus()
-            result = self.oldstatus_json()
+            if self._status_xml:
+                return await self.oldstatus()
+            result = await self.oldstatus_json()
+            if result is None:
+                _LOGGER.debug("status.json not available, falling back to status.xml")
+                result = await self.oldstatus()
             return result
 
-        i = 0
-        while i <= 3:
-            headers = {**defaultHeaders, "Cookie": "connect.sid=" + self.sid}
-            r = requests.get(f"http://{self.deviceip}/rest/status?_=" + str(round(time.time())), headers=headers)
-            # _LOGGER.debug(r.text)
-
-            if r.status_code == 200:
-                return r.json()
-            elif r.status_code == 401:
-                self.auth()
-            else:
-                _LOGGER.debug("Unknown error occurred")
-                return {}
-            i += 1
+        async with self._authed_request("GET", "/rest/status?_=" + str(round(time.time()))) as r:
+            # _LOGGER.debug(await r.text())
+
+            if r.status == 200:
+                return await self._read_status(r)
+            _LOGGER.debug(f"Unknown error occurred ({r.status})")
+            return None
+
+    async def subscribe(self, interval=SUBSCRIBE_INTERVAL):
+        """Yield the status every interval seconds, until an error is raised.
+
+        Apex firmware cannot push changes, so this polls the full status. If the
+        firmware sends an ETag, an unchanged status is answered with 304 and skipped.
+        """
+        etag = None
+        while True:
+            await self._auth.async_valid()
+            if self.version == "old":
+                yield await self.status()
+                await asyncio.sleep(interval)
+                continue
+
+            headers = {"If-None-Match": etag} if etag is not None else None
+            result = None
+            async with self._authed_request(
+                "GET", "/rest/status", headers=headers, metric="/rest/status/subscribe"
+            ) as r:
+                if r.status == 200:
+                    etag = r.headers.get("ETag")
+                    result = await self._read_status(r)
+                elif r.status != 304:
+                    raise aiohttp.ClientResponseError(
+                        r.request_info, r.history, status=r.status, message="subscribe failed"
+                    )
+            if result is not None:
+                yield result
+            await asyncio.sleep(interval)
+
+    async def config(self):
+        await self._auth.async_valid()
 
-    def config(self):
         if self.version == "old":
             result = {}
             return result
 
-        if self.sid is None:
-            _LOGGER.debug("We are none")
-            self.auth()
-        headers = {**defaultHeaders, "Cookie": "connect.sid=" + self.sid}
-
-        r = requests.get(f"http://{self.deviceip}/rest/config?_=" + str(round(time.time())), headers=headers)
-        # _LOGGER.debug(r.text)
-
-        if r.status_code == 200:
-            return r.json()
-        else:
-            print("Error occurred")
+        headers = self._config_validators if self.config_cache is not None else None
+        async with self._authed_request(
+            "GET", "/rest/config?_=" + str(round(time.time())), headers=headers
+        ) as r:
+            # _LOGGER.debug(await r.text())
+
+            if r.status == 304 and self.config_cache is not None:
+                self.config_unchanged += 1
+                self._config_checked = time.monotonic()
+                return self.config_cache
+            if r.status == 200:
+                validators = {}
+                if "ETag" in r.headers:
+                    validators["If-None-Match"] = r.headers["ETag"]
+                if "Last-Modified" in r.headers:
+                    validators["If-Modified-Since"] = r.headers["Last-Modified"]
+                raw = await r.read()
+                # Without validators the raw body tells whether decoding can be skipped
+                digest = hashlib.blake2b(raw, digest_size=16).digest()
+                self._config_validators = validators
+                self._config_checked = time.monotonic()
+                if digest == self._config_digest and self.config_cache is not None:
+                    self.config_unchanged += 1
+                    return self.config_cache
+                self.config_cache = json.loads(raw)
+                self._config_digest = digest
+                return self.config_cache
+            else:
+                _LOGGER.debug(f"config: Error occurred ({r.status})")
+
+    async def cached_config(self, refresh=False, max_age=None):
+        """Return the cached config, only fetching /rest/config when empty or asked to.
+
+        With max_age, a cache not confirmed by the controller within that many seconds
+        is revalidated first. The validators keep this to a 304 when nothing changed.
+        """
+        if max_age is not None and (
+            self._config_checked is None or time.monotonic() - self._config_checked > max_age
+        ):
+            refresh = True
+        if refresh or self.config_cache is None:
+            await self.config()
+        return self.config_cache
+
+    async def _cached_config_item(self, lookup):
+        """Find a config item to write back to the controller.
+
+        The cache is revalidated first when older than CONFIG_WRITE_MAX_AGE, so the
+        entry written holds any changes made on the controller since it was fetched.
+        """
+        config = await self.cached_config(max_age=CONFIG_WRITE_MAX_AGE)
+        checked = self._config_checked
+        if config is None or checked is None or time.monotonic() - checked > CONFIG_WRITE_MAX_AGE:
+            _LOGGER.warning("Could not re-read the controller config, not writing a stale copy")
+            return None
+        return lookup(config)
+
+    async def toggle_output(self, did, state):
+        # Log in first, the firmware version decides how to send the command
+        await self._auth.async_valid()
 
-    def toggle_output(self, did, state):
         # _LOGGER.debug(f"toggle_output [{self.version}]: did[{did}] state[{state}]")
 
         if self.version == "old":
-            headers = {**defaultHeaders}
-            headers['Authorization'] = self.sid
-            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
             # 1 = OFF, 0 = AUTO, 2 = ON
             state_value = 1
@@ -248,13 +366,9 @@ class Apex(object):
             data = f"{object_name}_state={state_value}&noResponse=1"
             _LOGGER.debug(f"toggle_output [old] Out Data: {data}")
 
-            headers['Content-Length'] = f"{len(data)}"
-            _LOGGER.debug(f"toggle_output [old] Headers: {headers}")
-
             try:
-                url = f"http://{self.deviceip}/cgi-bin/status.cgi"
-                r = requests.post(url, headers=headers, data=data, proxies={"http": None, "https": None})
-                _LOGGER.debug(f"toggle_output [old] ({r.status_code}): {r.text}")
+                async with self._authed_request("POST", "/cgi-bin/status.cgi", headers=headers, data=data) as r:
+                    _LOGGER.debug(f"toggle_output [old] ({r.status}): {await r.text()}")
             except Exception as e:
                 _LOGGER.debug(f"toggle_output [old] Exception: {e}")
 
@@ -264,19 +378,20 @@ class Apex(object):
             return status_data
 
 
-        headers = {**defaultHeaders, "Cookie": "connect.sid=" + self.sid}
-
         # I gave this "type": "outlet" a bit of side-eye, but it seems to be fine even if the
         # target is not technically an outlet.
         data = {"did": did, "status": [state, "", "OK", ""], "type": "outlet"}
         _LOGGER.debug(data)
 
-        r = requests.put(f"http://{self.deviceip}/rest/status/outputs/" + did, headers=headers, json=data)
-        data = r.json()
+        async with self._authed_request("PUT", "/rest/status/outputs/" + did, json=data) as r:
+            data = await r.json(content_type=None)
         _LOGGER.debug(data)
         return data
 
-    def toggle_feed_cycle(self, did, state):
+    async def toggle_feed_cycle(self, did, state):
+        # Log in first, the firmware version decides how to send the command
+        await self._auth.async_valid()
+
         _LOGGER.debug(f"toggle_feed_cycle [{self.version}]: did[{did}] state[{state}]")
 
         if self.version == "old":
@@ -305,20 +420,14 @@ class Apex(object):
                 ret_state = 1
                 ret_did = did
 
-            headers = {**defaultHeaders}
-            headers['Authorization'] = self.sid
-            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
             data = f"FeedCycle=Feed&FeedSel={FeedSel}&noResponse=1"
             # _LOGGER.debug(f"toggle_feed_cycle [old] Out Data: {data}")
 
-            headers['Content-Length'] = f"{len(data)}"
-            # _LOGGER.debug(f"toggle_feed_cycle [old] Headers: {headers}")
-
             try:
-                url = f"http://{self.deviceip}/cgi-bin/status.cgi"
-                r = requests.post(url, headers=headers, data=data, proxies={"http": None, "https": None})
-                _LOGGER.debug(f"toggle_feed_cycle [old] ({r.status_code}): {r.text}")
+                async with self._authed_request("POST", "/cgi-bin/status.cgi", headers=headers, data=data) as r:
+                    _LOGGER.debug(f"toggle_feed_cycle [old] ({r.status}): {await r.text()}")
             except Exception as e:
                 _LOGGER.debug(f"toggle_feed_cycle [old] Exception: {e}")
 
@@ -332,32 +441,29 @@ class Apex(object):
             return status_data
 
 
-        headers = {**defaultHeaders, "Cookie": "connect.sid=" + self.sid}
         if state == "ON":
             data = {"active": 1, "errorCode": 0, "errorMessage": "", "name": did}
-
-            r = requests.put(f"http://{self.deviceip}/rest/status/feed/" + did, headers=headers, json=data)
+            path = "/rest/status/feed/" + did
         elif state == "OFF":
             data = {"active": 92, "errorCode": 0, "errorMessage": "", "name": 0}
-            _LOGGER.debug(data)
-
-            r = requests.put(f"http://{self.deviceip}/rest/status/feed/0" , headers=headers, json=data)
+            path = "/rest/status/feed/0"
         _LOGGER.debug(data)
 
-        data = r.json()
+        async with self._authed_request("PUT", path, json=data) as r:
+            data = await r.json(content_type=None)
         _LOGGER.debug(data)
         return data
 
-    def set_variable(self, did, code):
+    async def set_variable(self, did, code):
+        # Log in first, the firmware version decides how to send the command
+        await self._auth.async_valid()
+
         if self.version == "old":
             return {"error": "Not available on Apex Classic"}
 
-        headers = {**defaultHeaders, "Cookie": "connect.sid=" + self.sid}
-        config = self.config()
-        variable = None
-        for value in config["oconf"]:
-            if value["did"] == did:
-                variable = value
+        variable = await self._cached_config_item(
+            lambda config: next((value for value in config.get("oconf", []) if value["did"] == did), None)
+        )
 
         if variable is None:
             return {"error": "Variable/did not found"}
@@ -368,49 +474,62 @@ class Apex(object):
         #     _LOGGER.debug("Only Advanced mode currently supported")
         #     return {"error": "Given variable was not of type Advanced"}
 
-        variable["ctype"] = "Advanced"
-        variable["prog"] = code
-        _LOGGER.debug(variable)
+        update = {**variable, "ctype": "Advanced", "prog": code}
+        _LOGGER.debug(update)
 
-        r = requests.put(f"http://{self.deviceip}/rest/config/oconf/" + did, headers=headers, json=variable)
-        _LOGGER.debug(r.text)
+        async with self._authed_request("PUT", "/rest/config/oconf/" + did, json=update) as r:
+            _LOGGER.debug(await r.text())
+            if not r.ok:
+                self.config_cache = None
+                return {"error": f"Failed to update {did} ({r.status})"}
 
+        # Keep the cached config in step with the controller instead of re-fetching it
+        self._patch_cached_config("oconf", variable, update)
         return {"error": ""}
-    
-    def update_firmware(self):
+
+    async def update_firmware(self):
+        # Log in first, the firmware version decides how to send the command
+        await self._auth.async_valid()
+
         if self.version == "old":
             return {"error": "Not available on Apex Classic"}
 
-        headers = {**defaultHeaders, "Cookie": "connect.sid=" + self.sid}
-        config = self.config()
-
-        nconf = config["nconf"]
+        nconf = await self._cached_config_item(lambda config: config.get("nconf"))
+        if nconf is None:
+            return False
 
-        nconf["updateFirmware"] = True
+        nconf = {**nconf, "updateFirmware": True}
 
-        r = requests.put(f"http://{self.deviceip}/rest/config/nconf", headers=headers, json=nconf)
-        _LOGGER.debug(r.text)
-        _LOGGER.debug(r.status_code)
-        if (r.status_code == 200):
-            return True
-        else:
-            return False
+        async with self._authed_request("PUT", "/rest/config/nconf", json=nconf) as r:
+            _LOGGER.debug(await r.text())
+            _LOGGER.debug(r.status)
+            # The controller reboots into the new firmware, so its config has to be re-read
+            self.config_cache = None
+            if (r.status == 200):
+                return True
+            else:
+                return False
 
-    def set_dos_rate(self, did, profile_id, rate):
+    async def set_dos_rate(self, did, profile_id, rate):
+        # Log in first, the firmware version decides how to send the command
+        await self._auth.async_valid()
 
         if self.version == "old":
             return {"error": "Not available on Apex Classic"}
 
-        headers = {**defaultHeaders, "Cookie": "connect.sid=" + self.sid}
-        config = self.config()
+        def find_profile(config):
+            profiles = config.get("pconf", [])
+            if 0 < profile_id <= len(profiles) and int(profiles[profile_id - 1]["ID"]) == profile_id:
+                return profiles[profile_id - 1]
+            return None
 
-        profile = config["pconf"][profile_id - 1]
-        if int(profile["ID"]) != profile_id:
+        profile = await self._cached_config_item(find_profile)
+        if profile is None:
             return {"error": "Profile index mismatch"}
 
         # turn the pump off to start - this will enable a new profile setting to start immediately
         # without it, the DOS will wait until the current profile period expires
-        off = self.set_variable(did, f"Set OFF")
+        off = await self.set_variable(did, f"Set OFF")
         if off["error"] != "":
             return off
 
@@ -437,19 +556,22 @@ class Apex(object):
 
                 # we set the profile to be what we need it to be so the user doesn't have to do
                 # anything except choose the profile to use
-                profile["type"] = "dose"
-                profile["name"] = f"Dose_{did}"
+                update = {**profile, "type": "dose", "name": f"Dose_{did}"}
 
                 # the DOS profile is the mode, target amount, target time period (one minute), and
                 # dose count
-                profile["data"] = {"mode": mode, "amount": rate, "time": 60, "count": 255}
-                _LOGGER.debug(profile)
+                update["data"] = {"mode": mode, "amount": rate, "time": 60, "count": 255}
+                _LOGGER.debug(update)
 
-                r = requests.put(f"http://{self.deviceip}/rest/config/pconf/{profile_id}", headers=headers, json=profile)
-                # _LOGGER.debug(r.text)
+                async with self._authed_request("PUT", f"/rest/config/pconf/{profile_id}", json=update) as r:
+                    # _LOGGER.debug(await r.text())
+                    if not r.ok:
+                        self.config_cache = None
+                        return {"error": f"Failed to update profile {profile_id} ({r.status})"}
+                self._patch_cached_config("pconf", profile, update)
 
                 # turn the pump on
-                return self.set_variable(did, f"Set {profile['name']}")
+                return await self.set_variable(did, f"Set {update['name']}")
             else:
                 return {"error": f"Requested rate ({rate} mL / min) exceeds the supported range (limit {int(pump_speeds[0] / safety_margin)} mL / min)."}
         else:
@@ -0,0 +1,168 @@
+"""Login handling shared by all requests to one Apex controller."""
+import asyncio
+import base64
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Log in again before the controller is likely to drop an idle session
+SESSION_REFRESH = 1800
+# Failed logins are retried after 5, 10, 20 ... seconds, at most every 5 minutes
+AUTH_BACKOFF = 5
+AUTH_BACKOFF_MAX = 300
+
+# Auth schemes by firmware: REST session cookie, classic Basic Auth, or classic without auth
+SCHEME_SESSION = "session"
+SCHEME_BASIC = "basic"
+SCHEME_NONE = "none"
+
+
+class ApexAuthError(Exception):
+    """Logging in to the controller failed."""
+
+
+class ApexAuth(object):
+    """Single-flight login for one controller.
+
+    Concurrent requests that find the session expired share one login: each passes the
+    generation it sent its request with, and only the first caller for a generation
+    logs in. The scheme the firmware accepted is remembered so later logins go straight
+    to it, session logins are renewed before they expire and failed logins back off
+    exponentially.
+    """
+
+    def __init__(self, session_getter, username, password, deviceip, timeout=None):
+        self._session = session_getter
+        self._timeout = timeout
+        self.username = username
+        self.password = password
+        self.deviceip = deviceip
+        self.scheme = None
+        # Scheme of the last successful login, kept while backing off after failures
+        self._detected = None
+        # Headers sent with every request, empty until logged in
+        self.headers = {}
+        self.sid = None
+        self.generation = 0
+        self.logins = 0
+        self._lock = asyncio.Lock()
+        self._refresh_at = None
+        self._failures = 0
+        self._retry_at = 0
+
+    @property
+    def classic(self):
+        """Return True if the controller uses the classic cgi-bin interface.
+
+        Known from the last successful login, even while the scheme is being detected
+        again after a failed one.
+        """
+        return (self.scheme or self._detected) in (SCHEME_BASIC, SCHEME_NONE)
+
+    async def async_valid(self):
+        """Log in if not logged in yet or the session is due for renewal.
+
+        Returns the generation to pass to async_login if a request is rejected.
+        """
+        if self.scheme is None or (self._refresh_at is not None and time.monotonic() >= self._refresh_at):
+            if not await self.async_login(self.generation):
+                raise ApexAuthError(f"Unable to log in to Apex at {self.deviceip}")
+        return self.generation
+
+    async def async_login(self, generation=None):
+        """Log in unless another caller already did since generation was current.
+
+        Returns True when logged in. While backing off after a failed login this returns
+        False without contacting the controller.
+        """
+        async with self._lock:
+            if generation is not None and generation != self.generation:
+                return True
+            if time.monotonic() < self._retry_at:
+                _LOGGER.debug(f"Not logging in to {self.deviceip} while backing off")
+                return False
+            try:
+                ok = await self._login()
+            except Exception:
+                self._failed()
+                raise
+            if ok:
+                self._detected = self.scheme
+                self.generation += 1
+                self.logins += 1
+                self._failures = 0
+                self._retry_at = 0
+                self._refresh_at = time.monotonic() + SESSION_REFRESH if self.scheme == SCHEME_SESSION else None
+            else:
+                self._failed()
+            return ok
+
+    def _failed(self):
+        # Detect the scheme again on the next attempt, e.g. after a firmware change
+        self.scheme = None
+        self._failures += 1
+        delay = min(AUTH_BACKOFF_MAX, AUTH_BACKOFF * 2 ** (self._failures - 1))
+        self._retry_at = time.monotonic() + delay
+        _LOGGER.warning(f"Login to Apex at {self.deviceip} failed, retrying in {delay} seconds")
+
+    async def _login(self):
+        if self.scheme == SCHEME_SESSION:
+            return await self._session_login() is True
+        if self.scheme == SCHEME_BASIC:
+            return await self._basic_login()
+        # Without a remembered scheme, or if a controller without auth rejected a request
+        return await self._detect()
+
+    async def _detect(self):
+        """Find the scheme the firmware uses and log in with it."""
+        result = await self._session_login()
+        if result is True:
+            return True
+        if result == 404:
+            _LOGGER.info("Detected old version of the device software.")
+            self.scheme = SCHEME_NONE
+            self.headers = {}
+            self.sid = None
+            return True
+        if result == 401:
+            _LOGGER.info(f"Basic Auth attempt because of 401 error")
+            return await self._basic_login()
+        return False
+
+    async def _session_login(self):
+        """POST /rest/login, returning True on success or the response status."""
+        data = {"login": self.username, "password": self.password, "remember_me": False}
+        _LOGGER.debug(f"Sending POST request to http://{self.deviceip}/rest/login")
+        async with self._session().post(
+            f"http://{self.deviceip}/rest/login", json=data, timeout=self._timeout
+        ) as r:
+            _LOGGER.debug(f"Response status code: {r.status}")
+            if r.status == 200:
+                sid = (await r.json(content_type=None)).get("connect.sid", None)
+                if sid:
+                    self.scheme = SCHEME_SESSION
+                    self.sid = sid
+                    self.headers = {"Cookie": "connect.sid=" + sid}
+                    _LOGGER.debug(f"Successfully authenticated with session. Session ID: {sid}")
+                    return True
+                _LOGGER.error("Session ID missing in the response.")
+            elif r.status not in (401, 404):
+                _LOGGER.warning(f"Unexpected status code: {r.status}")
+            return r.status
+
+    async def _basic_login(self):
+        basic_auth_header = base64.b64encode(f"{self.username}:{self.password}".encode()).decode('utf-8')
+        headers = {"Authorization": f"Basic {basic_auth_header}"}
+        async with self._session().post(
+            f"http://{self.deviceip}/", headers=headers, timeout=self._timeout
+        ) as r:
+            _LOGGER.debug(f"Basic Auth Response status code: {r.status}")
+            if r.status == 200:
+                self.scheme = SCHEME_BASIC
+                self.sid = f"Basic {basic_auth_header}"
+                self.headers = headers
+                _LOGGER.info("Successfully authenticated using Basic Auth.")
+                return True
+        _LOGGER.error("Failed to authenticate using both methods.")
+        return False
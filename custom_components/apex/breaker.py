@@ -0,0 +1,77 @@
+"""Circuit breaker that stops polling a controller which keeps failing."""
+from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class ApexCircuitBreaker(object):
+    """Track consecutive poll failures of one controller.
+
+    After threshold failures in a row the breaker opens: instead of full polls the
+    coordinator sends a cheap probe, first after backoff seconds and then twice as long
+    after every failed probe up to max_backoff. A successful probe half-opens the
+    breaker for one full poll, which closes it again if it succeeds.
+    """
+
+    def __init__(self, threshold, backoff, max_backoff):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.state = BREAKER_CLOSED
+        self.failures = 0
+        self.probes = 0
+        self.opened_at = None
+        self.last_error = None
+        self.retry_in = None
+        self._listeners = []
+
+    @property
+    def is_open(self):
+        return self.state == BREAKER_OPEN
+
+    @callback
+    def async_add_listener(self, update_callback):
+        """Call update_callback on every state change, returns a function to stop."""
+        self._listeners.append(update_callback)
+        return lambda: self._listeners.remove(update_callback)
+
+    def record_success(self):
+        """Return True if this closed an open or half-open breaker."""
+        recovered = self.state != BREAKER_CLOSED
+        self.failures = 0
+        self.probes = 0
+        self.retry_in = None
+        if recovered:
+            self.opened_at = None
+            self._set_state(BREAKER_CLOSED)
+        return recovered
+
+    def record_failure(self, error):
+        """Return True if this failure opened the breaker."""
+        self.failures += 1
+        self.last_error = str(error) or type(error).__name__
+        if self.state == BREAKER_CLOSED and self.failures < self.threshold:
+            return False
+        opened = self.state == BREAKER_CLOSED
+        if opened:
+            self.opened_at = dt_util.utcnow()
+        self.retry_in = min(self.max_backoff, self.backoff * 2 ** self.probes)
+        self._set_state(BREAKER_OPEN)
+        return opened
+
+    def record_probe(self, reachable):
+        """Half-open the breaker after a successful probe, back off further otherwise."""
+        self.probes += 1
+        if reachable:
+            self._set_state(BREAKER_HALF_OPEN)
+        else:
+            self.retry_in = min(self.max_backoff, self.backoff * 2 ** self.probes)
+            self._set_state(BREAKER_OPEN)
+
+    def _set_state(self, state):
+        self.state = state
+        for update_callback in list(self._listeners):
+            update_callback()
@@ -0,0 +1,110 @@
+"""On-disk cache of the layout and last status of each controller.
+
+Lets setup create entities with their last known state straight away instead of
+waiting for the controller to answer a poll.
+"""
+import logging
+
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .parser import ApexFeed, ApexInput, ApexOutput, ApexStatus, ApexSystem
+
+_LOGGER = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+# Polls are coalesced into at most one write per this many seconds
+CACHE_SAVE_DELAY = 60
+# Keep the cache bounded: controllers with more records than this are not cached and
+# longer strings, e.g. Advanced programs, are cut.
+CACHE_MAX_RECORDS = 1024
+CACHE_MAX_TEXT = 1024
+
+
+def _text(value):
+    if isinstance(value, str) and len(value) > CACHE_MAX_TEXT:
+        return value[:CACHE_MAX_TEXT]
+    return value
+
+
+class ApexStatusCache(object):
+    """Persist the last polled status and config of one controller across restarts.
+
+    Records are stored as lists in field order to keep the file compact. Home
+    Assistant replaces the file atomically on every write.
+    """
+
+    def __init__(self, hass, entry_id):
+        self._hass = hass
+        self._store = Store(
+            hass, CACHE_VERSION, f"{DOMAIN}.{entry_id}.layout", atomic_writes=True
+        )
+        self._snapshot = None
+        self._pending = False
+        self._too_large = False
+
+    async def async_load(self):
+        """Return (status, config) from the cache, or None."""
+        data = await self._store.async_load()
+        if data is None:
+            return None
+        feed = data["feed"]
+        status = ApexStatus(
+            ApexSystem(*data["system"]),
+            ApexFeed(*feed) if feed is not None else None,
+            tuple(ApexInput(*value) for value in data["inputs"]),
+            tuple(ApexOutput(did, type, name, tuple(status), *rest) for did, type, name, status, *rest in data["outputs"]),
+        )
+        return status, data["config"]
+
+    def async_save(self, snapshot):
+        """Schedule writing snapshot, replacing what a pending write would have saved."""
+        if max(len(snapshot.inputs), len(snapshot.outputs), len(snapshot.oconf)) > CACHE_MAX_RECORDS:
+            if not self._too_large:
+                _LOGGER.debug("Controller has too many records to cache, removing the cache")
+                self._too_large = True
+                self._pending = False
+                self._hass.async_create_task(self._store.async_remove())
+            return
+        self._too_large = False
+        self._snapshot = snapshot
+        if not self._pending:
+            # Don't push back an already scheduled write on every poll
+            self._pending = True
+            self._store.async_delay_save(self._data_to_save, CACHE_SAVE_DELAY)
+
+    def _data_to_save(self):
+        self._pending = False
+        snapshot = self._snapshot
+        config = snapshot.config
+        nconf = config.get("nconf")
+        return {
+            "system": list(snapshot.system),
+            "feed": list(snapshot.feed) if snapshot.feed is not None else None,
+            "inputs": [
+                [value.did, value.type, _text(value.name), _text(value.value)]
+                for value in snapshot.inputs.values()
+            ],
+            "outputs": [
+                [value.did, value.type, _text(value.name), [_text(item) for item in value.status],
+                 value.ID, value.gid, value.intensity]
+                for value in snapshot.outputs.values()
+            ],
+            # Only the parts of the config entities read
+            "config": {
+                "oconf": [
+                    {"did": value["did"], "name": value.get("name"), "ctype": value.get("ctype"), "prog": _text(value.get("prog"))}
+                    for value in snapshot.oconf.values()
+                ],
+                "iconf": [
+                    {"did": value["did"], "name": value.get("name"), "extra": {
+                        key: item for key, item in value.get("extra", {}).items() if key == "range"
+                    }}
+                    for value in snapshot.iconf.values()
+                ],
+                **({"nconf": {"latestFirmware": nconf.get("latestFirmware")}} if nconf else {}),
+            } if config else {},
+        }
+
+    async def async_remove(self):
+        await self._store.async_remove()
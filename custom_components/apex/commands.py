@@ -0,0 +1,143 @@
+"""Command queue that coalesces output and feed commands for one Apex controller."""
+import asyncio
+import logging
+
+from .apex import MAX_CONNECTIONS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Commands for the same output arriving within this many seconds are merged
+COMMAND_DEBOUNCE = 0.5
+# Outputs waiting to be sent before further commands have to wait for the queue to drain
+COMMAND_QUEUE_SIZE = 32
+
+
+class _PendingCommand(object):
+    __slots__ = ("send", "target", "futures")
+
+    def __init__(self):
+        self.send = None
+        # What the command to send acts on, and (target, future) for each caller
+        self.target = None
+        self.futures = []
+
+
+class ApexCommandQueue(object):
+    """Per controller queue that only sends the last requested state of each output.
+
+    Commands are held for a short window. A later command for the same output replaces
+    the earlier one, and every caller for the same target gets the result of the command
+    that was actually sent. Callers superseded by a command for another target, e.g. a
+    different feed cycle, get None as their command was never sent. Different outputs
+    are started in the order they were first queued, at most limit at a time, and a
+    batch is only sent once the previous one has finished. Once max_pending outputs are
+    waiting, new commands wait until the queue has drained. on_flush is called once
+    after each batch has been sent and must not block, e.g. only schedule a refresh.
+    """
+
+    def __init__(
+            self, apex, on_flush=None, window=COMMAND_DEBOUNCE, max_pending=COMMAND_QUEUE_SIZE,
+            limit=MAX_CONNECTIONS
+    ):
+        self._apex = apex
+        self._on_flush = on_flush
+        self._window = window
+        self._max_pending = max_pending
+        self._limit = limit
+        self._pending = {}
+        self._changed = asyncio.Condition()
+        self._task = None
+
+    async def async_output(self, did, state):
+        """Queue setting an output and return the controller's response."""
+        return await self._enqueue(
+            ("output", did), did, lambda: self._apex.toggle_output(did, state)
+        )
+
+    async def async_outputs(self, outputs):
+        """Queue setting several outputs, given as (did, state) pairs.
+
+        Returns the controller's response, or the exception raised, for each pair in
+        the same order.
+        """
+        return await asyncio.gather(
+            *(self.async_output(did, state) for did, state in outputs), return_exceptions=True
+        )
+
+    async def async_feed(self, did, state):
+        """Queue starting or cancelling a feed cycle and return the controller's response.
+
+        Only one feed cycle can run at a time, so any feed command replaces a pending one.
+        Returns None if it was replaced by a command for another feed cycle.
+        """
+        return await self._enqueue(
+            ("feed",), did, lambda: self._apex.toggle_feed_cycle(did, state)
+        )
+
+    async def async_shutdown(self):
+        """Stop sending and cancel anything still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for command in self._pending.values():
+            for _, future in command.futures:
+                future.cancel()
+        self._pending = {}
+
+    async def _enqueue(self, key, target, send):
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: key in self._pending or len(self._pending) < self._max_pending
+            )
+            command = self._pending.get(key)
+            if command is None:
+                command = self._pending[key] = _PendingCommand()
+            else:
+                _LOGGER.debug(f"Superseding queued command for {key}")
+            command.send = send
+            command.target = target
+            future = asyncio.get_running_loop().create_future()
+            command.futures.append((target, future))
+            if self._task is None:
+                self._task = asyncio.create_task(self._run())
+        return await future
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._window)
+            async with self._changed:
+                batch, self._pending = self._pending, {}
+                if not batch:
+                    self._task = None
+                    return
+                self._changed.notify_all()
+
+            semaphore = asyncio.Semaphore(self._limit)
+            try:
+                await asyncio.gather(*(self._send(command, semaphore) for command in batch.values()))
+            except asyncio.CancelledError:
+                for command in batch.values():
+                    for _, future in command.futures:
+                        future.cancel()
+                raise
+
+            if self._on_flush is not None:
+                self._on_flush()
+
+    async def _send(self, command, semaphore):
+        async with semaphore:
+            try:
+                result = await command.send()
+            except Exception as err:
+                _LOGGER.debug(f"Queued command failed: {err}")
+                for target, future in command.futures:
+                    if future.done():
+                        continue
+                    if target == command.target:
+                        future.set_exception(err)
+                    else:
+                        future.set_result(None)
+                return
+        for target, future in command.futures:
+            if not future.done():
+                future.set_result(result if target == command.target else None)
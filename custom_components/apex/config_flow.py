@@ -10,7 +10,22 @@ from .const import (  # pylint:disable=unused-import
     DOMAIN, 
     DEVICEIP,
     UPDATE_INTERVAL, 
-    UPDATE_INTERVAL_DEFAULT
+    UPDATE_INTERVAL_DEFAULT,
+    CONFIG_INTERVAL,
+    CONFIG_INTERVAL_DEFAULT,
+    MIN_INTERVAL,
+    MIN_INTERVAL_DEFAULT,
+    MAX_INTERVAL,
+    MAX_INTERVAL_DEFAULT,
+    ATTRIBUTES,
+    ATTRIBUTES_DEFAULT,
+    ATTRIBUTES_MINIMAL,
+    ATTRIBUTES_STANDARD,
+    ATTRIBUTES_FULL,
+    METRICS,
+    METRICS_DEFAULT,
+    SUBSCRIBE,
+    SUBSCRIBE_DEFAULT
 )
 from .apex import Apex
 
@@ -34,9 +49,11 @@ async def validate_input(hass: core.HomeAssistant, data):
     apex = Apex(data[CONF_USERNAME], data[CONF_PASSWORD], data[DEVICEIP])
 
     try:
-        result = await hass.async_add_executor_job(apex.auth)
+        result = await apex.auth()
     except Exception as ex:
         raise InvalidAuth from ex
+    finally:
+        await apex.close()
 
     if not result:
         _LOGGER.error("Failed to authenticate with Apex Controller")
@@ -96,6 +113,42 @@ class OptionsFlow(config_entries.OptionsFlow):
                     UPDATE_INTERVAL, UPDATE_INTERVAL_DEFAULT
                 ),
             ): int,
+            vol.Optional(
+                MIN_INTERVAL,
+                default=self.config_entry.options.get(
+                    MIN_INTERVAL, MIN_INTERVAL_DEFAULT
+                ),
+            ): int,
+            vol.Optional(
+                MAX_INTERVAL,
+                default=self.config_entry.options.get(
+                    MAX_INTERVAL, MAX_INTERVAL_DEFAULT
+                ),
+            ): int,
+            vol.Optional(
+                CONFIG_INTERVAL,
+                default=self.config_entry.options.get(
+                    CONFIG_INTERVAL, CONFIG_INTERVAL_DEFAULT
+                ),
+            ): int,
+            vol.Optional(
+                ATTRIBUTES,
+                default=self.config_entry.options.get(
+                    ATTRIBUTES, ATTRIBUTES_DEFAULT
+                ),
+            ): vol.In([ATTRIBUTES_MINIMAL, ATTRIBUTES_STANDARD, ATTRIBUTES_FULL]),
+            vol.Optional(
+                SUBSCRIBE,
+                default=self.config_entry.options.get(
+                    SUBSCRIBE, SUBSCRIBE_DEFAULT
+                ),
+            ): bool,
+            vol.Optional(
+                METRICS,
+                default=self.config_entry.options.get(
+                    METRICS, METRICS_DEFAULT
+                ),
+            ): bool,
         }
 
         return self.async_show_form(step_id="init", data_schema=vol.Schema(options))
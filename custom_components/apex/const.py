@@ -48,6 +48,12 @@ SENSORS = {
     "UNK" : {"icon": "mdi:help"}
 }
 
+# Entities of an input or output are removed once it is missing from this many polls in a row
+LAYOUT_REMOVE_POLLS = 3
+
+# Outputs that also get a sensor for their value
+SENSOR_OUTPUT_TYPES = ("dos", "variable", "virtual", "vortech", "iotaPump|Sicce|Syncra")
+
 MANUAL_SENSORS = [
     {"name": "Feed Cycle Countdown", "type": "feed", "did": "feed_countdown"}
 ]
@@ -59,3 +65,65 @@ MEASUREMENTS = {
 
 UPDATE_INTERVAL = "update_interval"
 UPDATE_INTERVAL_DEFAULT = 60
+
+CONFIG_INTERVAL = "config_interval"
+CONFIG_INTERVAL_DEFAULT = 3600
+
+MIN_INTERVAL = "min_interval"
+MIN_INTERVAL_DEFAULT = 5
+MAX_INTERVAL = "max_interval"
+MAX_INTERVAL_DEFAULT = 300
+# Poll at min_interval for this many seconds after a command is sent
+BOOST_DURATION = 120
+# Status and config are fetched at the same time, each giving up after these many
+# seconds. A failed config fetch keeps the last config instead of failing the poll.
+STATUS_TIMEOUT = 30
+CONFIG_TIMEOUT = 30
+
+# Polls of all controllers are spread over their interval and at most this many run at once
+FLEET_MAX_CONCURRENT = 4
+# Each poll interval is varied by up to this fraction so controllers don't line up again
+POLL_JITTER = 0.1
+DATA_SCHEDULER = "apex_scheduler"
+
+# Polling stops after this many failed polls in a row, the controller is then probed
+# after one update interval, doubling up to BREAKER_BACKOFF_MAX seconds.
+BREAKER_THRESHOLD = 3
+BREAKER_BACKOFF_MAX = 900
+
+# Poll the status every min_interval seconds between the regular polls and apply changes.
+# A failed subscription is restarted after SUBSCRIBE_RETRY seconds, doubling up to
+# SUBSCRIBE_RETRY_MAX.
+SUBSCRIBE = "subscribe"
+SUBSCRIBE_DEFAULT = False
+SUBSCRIBE_RETRY = 5
+SUBSCRIBE_RETRY_MAX = 300
+
+METRICS = "metrics"
+METRICS_DEFAULT = False
+# Diagnostic sensors added when metrics are enabled, durations are of the last poll.
+# Client metrics are counted by the Apex client whether or not metrics are enabled.
+METRIC_SENSORS = {
+    "poll": {"name": "Poll Duration", "icon": "mdi:timer-outline", "measurement": "ms"},
+    "fetch": {"name": "Fetch Duration", "icon": "mdi:timer-outline", "measurement": "ms"},
+    "parse": {"name": "Parse Duration", "icon": "mdi:timer-outline", "measurement": "ms"},
+    "index": {"name": "Index Duration", "icon": "mdi:timer-outline", "measurement": "ms"},
+    "dispatch": {"name": "Dispatch Duration", "icon": "mdi:timer-outline", "measurement": "ms"},
+    "status": {"name": "Status Latency", "icon": "mdi:timer-sand", "measurement": "ms"},
+    "config": {"name": "Config Latency", "icon": "mdi:timer-sand", "measurement": "ms"},
+    "status_bytes": {"name": "Status Size", "icon": "mdi:download", "measurement": "B"},
+    "retries": {"name": "Request Retries", "icon": "mdi:refresh", "total": True},
+    "logins": {"name": "Logins", "icon": "mdi:login", "total": True, "client": True},
+    "config_unchanged": {"name": "Unchanged Configs", "icon": "mdi:cached", "total": True, "client": True},
+}
+
+ATTRIBUTES = "attributes"
+ATTRIBUTES_MINIMAL = "minimal"
+ATTRIBUTES_STANDARD = "standard"
+ATTRIBUTES_FULL = "full"
+ATTRIBUTES_DEFAULT = ATTRIBUTES_STANDARD
+# State attributes each profile keeps, full keeps every field of the record or config entry
+ATTRIBUTE_FIELDS = {
+    ATTRIBUTES_MINIMAL: ("did", "type"),
+    ATTRIBUTES_STANDARD: ("did", "type", "name", "value", "status", "intensity", "ctype"),
+}
@@ -0,0 +1,31 @@
+"""Diagnostics support for Apex."""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+
+from .const import DOMAIN
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]
+    breaker = coordinator.breaker
+    data = coordinator.data
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "poll_timing": coordinator.poll_timing,
+        "breaker": {
+            "state": breaker.state,
+            "failures": breaker.failures,
+            "probes": breaker.probes,
+            "last_error": breaker.last_error,
+            "retry_in": breaker.retry_in,
+        },
+        "logins": coordinator.apex.logins,
+        "config_unchanged": coordinator.apex.config_unchanged,
+        "metrics": coordinator.metrics.as_dict() if coordinator.metrics is not None else None,
+        "system": data.system._asdict() if data is not None else None,
+        "inputs": len(data.inputs) if data is not None else None,
+        "outputs": len(data.outputs) if data is not None else None,
+    }
@@ -0,0 +1,128 @@
+"""Request and poll metrics of one Apex controller.
+
+Only created when the metrics option is enabled. The client and coordinator hold None
+otherwise and skip all measuring.
+"""
+import bisect
+
+# Upper bounds of the latency histogram buckets in milliseconds, the last one is open
+LATENCY_BUCKETS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Poll phases: fetch (status and config requests), parse (decoding the status once it
+# has arrived, included in fetch), index (building the snapshot and diffing it) and
+# dispatch (entities writing their state)
+PHASES = ("poll", "fetch", "parse", "index", "dispatch")
+# Status is read from the first of these the controller serves
+STATUS_ENDPOINTS = ("/rest/status", "/cgi-bin/status.json", "/cgi-bin/status.xml")
+
+
+def endpoint(path):
+    """Group request paths by endpoint, e.g. /rest/status/outputs/2_1 -> /rest/status/outputs."""
+    return "/" + "/".join(path.split("?", 1)[0].strip("/").split("/")[:3])
+
+
+class RequestStats(object):
+    __slots__ = ("count", "errors", "bytes", "last_bytes", "last_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.last_bytes = None
+        self.last_ms = None
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def percentile(self, pct):
+        """Return the upper bound of the bucket holding the pct percentile, in ms."""
+        if not self.count:
+            return None
+        rank = self.count * pct / 100
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else None
+        return None
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "last_bytes": self.last_bytes,
+            "last_ms": self.last_ms,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "histogram_ms": dict(zip([*map(str, LATENCY_BUCKETS), "inf"], self.buckets)),
+        }
+
+
+class PhaseStats(object):
+    __slots__ = ("count", "total_ms", "last_ms", "max_ms")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.last_ms = None
+        self.max_ms = 0.0
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "last_ms": self.last_ms,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": self.max_ms,
+        }
+
+
+class ApexMetrics(object):
+    """Latency histograms and sizes per endpoint, retry counts and poll phase timings."""
+
+    def __init__(self):
+        self.requests = {}
+        self.phases = {phase: PhaseStats() for phase in PHASES}
+        self.retries = 0
+
+    def record_request(self, path, seconds, size, ok):
+        key = endpoint(path)
+        stats = self.requests.get(key)
+        if stats is None:
+            stats = self.requests[key] = RequestStats()
+        ms = seconds * 1000
+        stats.count += 1
+        if not ok:
+            stats.errors += 1
+        stats.last_ms = round(ms, 3)
+        stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, ms)] += 1
+        if size is not None:
+            stats.bytes += size
+            stats.last_bytes = size
+
+    def record_phase(self, phase, seconds):
+        stats = self.phases[phase]
+        ms = round(seconds * 1000, 3)
+        stats.count += 1
+        stats.total_ms += ms
+        stats.last_ms = ms
+        stats.max_ms = max(stats.max_ms, ms)
+
+    def value(self, key):
+        """Return the latest value for a METRIC_SENSORS key."""
+        if key in self.phases:
+            return self.phases[key].last_ms
+        if key == "retries":
+            return self.retries
+        if key == "config":
+            stats = self.requests.get("/rest/config")
+        else:
+            stats = next((self.requests[path] for path in STATUS_ENDPOINTS if path in self.requests), None)
+        if stats is None:
+            return None
+        return stats.last_bytes if key == "status_bytes" else stats.last_ms
+
+    def as_dict(self):
+        return {
+            "retries": self.retries,
+            "requests": {key: stats.as_dict() for key, stats in self.requests.items()},
+            "phases": {key: stats.as_dict() for key, stats in self.phases.items()},
+        }
@@ -0,0 +1,95 @@
+"""Parser turning Apex status responses into compact records.
+
+The whole document is decoded with json.loads, then only the fields the integration
+uses are copied into tuples. Parsing costs a little more than keeping the dicts, but
+the records kept afterwards take less memory. The classic status.xml reader lives in
+xml_status.py so it is only imported when needed.
+"""
+import json
+from typing import Any, NamedTuple
+
+
+class ApexSystem(NamedTuple):
+    software: str
+    hardware: str
+
+
+class ApexInput(NamedTuple):
+    did: str
+    type: str
+    name: str
+    value: Any
+
+
+class ApexOutput(NamedTuple):
+    did: str
+    type: str
+    name: str
+    status: tuple
+    ID: Any = None
+    gid: Any = None
+    intensity: Any = None
+
+
+class ApexFeed(NamedTuple):
+    name: Any
+    active: Any = None
+    apex_type: str = "new"
+
+
+class ApexStatus(NamedTuple):
+    system: ApexSystem
+    feed: ApexFeed | None
+    inputs: tuple
+    outputs: tuple
+
+
+def input_record(value, _make=ApexInput._make):
+    get = value.get
+    return _make((value["did"], get("type", "variable"), value["name"], get("value")))
+
+
+def output_record(value, _make=ApexOutput._make):
+    get = value.get
+    return _make((
+        value["did"],
+        get("type", "outlet"),
+        value["name"],
+        tuple(get("status", ())),
+        get("ID"),
+        get("gid"),
+        get("intensity"),
+    ))
+
+
+def status_record(document, classic=False) -> ApexStatus:
+    """Build an ApexStatus from a decoded status document.
+
+    Classic controllers wrap the status in an "istat" object and report the system
+    info as separate keys.
+    """
+    if classic:
+        document = document["istat"]
+        system = ApexSystem(
+            document["software"],
+            f"{document['hostname']} {document['hardware']} {document['serial']}",
+        )
+    else:
+        system = ApexSystem(document["system"]["software"], document["system"]["hardware"])
+    feed = document.get("feed")
+    if feed is not None:
+        feed = ApexFeed(feed.get("name"), feed.get("active"), "old" if classic else "new")
+    return ApexStatus(
+        system,
+        feed,
+        tuple(map(input_record, document.get("inputs") or ())),
+        tuple(map(output_record, document.get("outputs") or ())),
+    )
+
+
+def parse_status(raw: bytes, classic=False) -> ApexStatus:
+    """Parse /rest/status or classic /cgi-bin/status.json.
+
+    Raises ValueError if the document is incomplete or invalid.
+    """
+    return status_record(json.loads(raw), classic)
@@ -0,0 +1,144 @@
+"""Static metadata of Apex entities, resolved once instead of on every state read."""
+import functools
+import logging
+import re
+from typing import Any, Callable, NamedTuple
+
+from homeassistant.components.sensor import SensorStateClass
+
+from .const import SENSORS, SWITCHES, MEASUREMENTS
+
+_LOGGER = logging.getLogger(__name__)
+
+_SET_VALUE = re.compile(r"Set\s[^\d]*(\d+)")
+
+
+class SensorMeta(NamedTuple):
+    icon: str | None
+    unit: str | None
+    state_class: Any
+    # Returns the state from (snapshot, did)
+    value: Callable
+
+
+@functools.lru_cache(maxsize=256)
+def process_prog(prog):
+    """Return the value an Advanced program sets, or the program if it sets none.
+
+    Cached by program text, so the regex only runs again when a program changes.
+    """
+    if len(prog) > 255:
+        return None
+    if "Set PF" in prog:
+        return prog
+    test = _SET_VALUE.findall(prog)
+    if test:
+        _LOGGER.debug(test[0])
+        return int(test[0])
+    else:
+        return prog
+
+
+def feed_value(data, did):
+    """Return the remaining feed time, in minutes or m:s on Apex Classic."""
+    if data.feed is not None:
+        # Apex Classic does feed with 6 as OFF and 1-4 as ON
+        if data.feed.apex_type == 'old':
+
+            _LOGGER.debug(f"get_value[state:feed]: old_data|{data.feed}")
+
+            name = data.feed.name
+            if name == 6:
+                return 0        # feed is off
+            else:
+                feed_value = data.feed.active
+                hour = feed_value
+                show_hour = 0
+                if ( feed_value > 3600 ):
+                    show_hour = 1
+                    hour = feed_value / 60
+                total_minutes = hour / 60
+                min = int(total_minutes)
+                sec = (total_minutes - min) * 60
+                if show_hour == 1:
+                    time = f"{hour:.0f}{min:.0f}:{sec:.0f}"
+                else:
+                    time = f"{min:.0f}:{sec:.0f}"
+                return time
+
+    # Handle "feed" if not Apex Classic
+    if data.feed is not None and data.feed.active is not None:
+        if data.feed.active > 50000:
+            return 0
+        else:
+            return round(data.feed.active / 60, 1)
+    else:
+        return 0
+
+
+def _program_value(data, did, record, variable):
+    if "oconf" in data.config:
+        config = data.oconf.get(did)
+        if config is not None:
+            if config["ctype"] == "Advanced":
+                return process_prog(config["prog"])
+            else:
+                return "Not an Advanced variable!"
+    elif variable and record.intensity is not None:
+        return record.intensity
+    return None
+
+
+# State of output sensors by output type, from (snapshot, did, output record)
+OUTPUT_VALUES = {
+    "dos": lambda data, did, record: record.status[4],
+    "iotaPump|Sicce|Syncra": lambda data, did, record: record.status[1],
+    "vortech": lambda data, did, record: f"{record.status[0]} {record.status[1]} {record.status[2]}",
+    "variable": lambda data, did, record: _program_value(data, did, record, True),
+    "virtual": lambda data, did, record: _program_value(data, did, record, False),
+}
+
+
+def _record_value(output_value):
+    def value(data, did):
+        record = data.inputs.get(did)
+        if record is not None:
+            return record.value
+        record = data.outputs.get(did)
+        if record is not None and output_value is not None:
+            return output_value(data, did, record)
+        return None
+    return value
+
+
+def resolve_sensor(sensor, iconf, temp_unit):
+    """Resolve the metadata of a sensor from its ApexEntityInfo and iconf entry."""
+    meta = SENSORS.get(sensor.type)
+    if meta is None:
+        _LOGGER.debug("Missing icon: " + sensor.type)
+
+    unit = None
+    if iconf is not None and iconf.get("extra", {}).get("range") in MEASUREMENTS:
+        unit = MEASUREMENTS[iconf["extra"]["range"]]
+    elif meta is not None and "measurement" in meta:
+        unit = temp_unit if sensor.type == "Temp" else meta["measurement"]
+
+    if sensor.type == "feed":
+        value = feed_value
+    else:
+        value = _record_value(OUTPUT_VALUES.get(sensor.type))
+
+    return SensorMeta(
+        meta["icon"] if meta is not None else None,
+        unit,
+        SensorStateClass.MEASUREMENT if meta is not None else None,
+        value,
+    )
+
+
+def resolve_switch_icon(switch):
+    """Return the icon of a switch from its ApexEntityInfo."""
+    if switch.type in SWITCHES:
+        return SWITCHES[switch.type]["icon"]
+    _LOGGER.debug("Missing icon: " + switch.type)
+    return None
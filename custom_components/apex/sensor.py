@@ -1,13 +1,23 @@
 import logging
-import re
 
 from homeassistant.components.sensor import (
+    SensorDeviceClass,
     SensorEntity,
     SensorStateClass,
 )
-
-from . import ApexEntity
-from .const import DOMAIN, SENSORS, MEASUREMENTS, MANUAL_SENSORS
+from homeassistant.helpers.entity import EntityCategory
+
+from . import ApexEntity, ApexEntityInfo, ApexLayoutTracker
+from .breaker import BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN
+from .const import (
+    DOMAIN,
+    MANUAL_SENSORS,
+    METRIC_SENSORS,
+    SENSOR_OUTPUT_TYPES,
+    ATTRIBUTES,
+    ATTRIBUTES_DEFAULT
+)
+from .resolver import resolve_sensor
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,20 +32,32 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
 
     """Add the Entities from the config."""
     entry = hass.data[DOMAIN][config_entry.entry_id]
-
-    for value in entry.data["inputs"]:
-        sensor = ApexSensor(entry, value, config_entry.options)
-        async_add_entities([sensor], True)
-    for value in entry.data["outputs"]:
-        if value["type"] in ("dos", "variable", "virtual", "vortech", "iotaPump|Sicce|Syncra"):
-            sensor = ApexSensor(entry, value, config_entry.options)
-            async_add_entities([sensor], True)
-            
+    options = config_entry.options
+
+    tracker = ApexLayoutTracker(
+        hass, entry, async_add_entities,
+        inputs=lambda value: ApexSensor(entry, ApexEntityInfo.from_record(value), options),
+        outputs=lambda value: (
+            ApexSensor(entry, ApexEntityInfo.from_record(value), options)
+            if value.type in SENSOR_OUTPUT_TYPES else None
+        ),
+    )
+    entities = tracker.build()
 
     """Add Feed Status Remaining Time"""
-    for value in MANUAL_SENSORS:
-        sensor = ApexSensor(entry, value, config_entry.options)
-        async_add_entities([sensor], True)
+    entities += [ApexSensor(entry, ApexEntityInfo(**value), options) for value in MANUAL_SENSORS]
+
+    """Add Connection Diagnostic"""
+    entities.append(ApexConnectionSensor(entry))
+
+    """Add Metric Diagnostics"""
+    if entry.metrics is not None:
+        entities += [ApexMetricSensor(entry, key) for key in METRIC_SENSORS]
+
+    # One registration for all entities, the coordinator already holds their data
+    async_add_entities(entities)
+    # Inputs and outputs added or removed on the controller later on
+    config_entry.async_on_unload(entry.async_add_layout_listener(tracker.async_update))
 
 
 class ApexSensor(ApexEntity, SensorEntity):
@@ -43,121 +65,63 @@ class ApexSensor(ApexEntity, SensorEntity):
         _LOGGER.debug(sensor)
         self.sensor = sensor
         self.options = options
+        self.attribute_profile = options.get(ATTRIBUTES, ATTRIBUTES_DEFAULT)
         self._attr = {}
+        self._meta = None
+        self._iconf = None
         self.coordinator = coordinator
-        self._device_id = "apex_" + sensor["name"]
+        self._device_id = "apex_" + sensor.name
         # Required for HA 2022.7
         self.coordinator_context = object()
 
-    # Need to tidy this section up and avoid using so many for loops
+    @property
+    def meta(self):
+        """Return the resolved SensorMeta, resolving again if the iconf entry changed."""
+        iconf = self.coordinator.data.iconf.get(self.sensor.did)
+        if self._meta is None or iconf is not self._iconf:
+            self._iconf = iconf
+            self._meta = resolve_sensor(self.sensor, iconf, _SYSTEM_TEMP_UNIT)
+        return self._meta
+
     def get_value(self, ftype):
+        data = self.coordinator.data
+        did = self.sensor.did
         if ftype == "state":
-            if self.sensor["type"] == "feed":
-                # _LOGGER.debug(f"get_value[state:feed]: coordinator.data|{self.coordinator.data}")
-
-                if "feed" in self.coordinator.data:
-                    # Determine if new or old Apex
-                    apex_type = "new"
-
-                    if "apex_type" in self.coordinator.data["feed"]:
-                        apex_type = self.coordinator.data["feed"]["apex_type"]
-
-                    # Apex Classic does feed with 6 as OFF and 1-4 as ON
-                    if apex_type == 'old':
-
-                        _LOGGER.debug(f"get_value[state:feed]: old_data|{self.coordinator.data["feed"]}")
-
-                        name = self.coordinator.data["feed"]["name"]
-                        if name == 6:
-                            return 0        # feed is off
-                        else:
-                            feed_value = self.coordinator.data["feed"]["active"]
-                            hour = feed_value
-                            show_hour = 0
-                            if ( feed_value > 3600 ):
-                                show_hour = 1
-                                hour = feed_value / 60
-                            total_minutes = hour / 60
-                            min = int(total_minutes)
-                            sec = (total_minutes - min) * 60
-                            if show_hour == 1:
-                                time = f"{hour:.0f}{min:.0f}:{sec:.0f}"
-                            else:
-                                time = f"{min:.0f}:{sec:.0f}"
-                            return time
-
-                # Handle "feed" if not Apex Classic
-                if "feed" in self.coordinator.data and "active" in self.coordinator.data["feed"]:
-                    if self.coordinator.data["feed"]["active"] > 50000:
-                        return 0
-                    else:
-                        return round(self.coordinator.data["feed"]["active"] / 60, 1)
-                else:
-                    return 0
-            for value in self.coordinator.data["inputs"]:
-                if value["did"] == self.sensor["did"]:
-                    return value["value"]
-            for value in self.coordinator.data["outputs"]:
-                if value["did"] == self.sensor["did"]:
-                    if self.sensor["type"] == "dos":
-                        return value["status"][4]
-                    if self.sensor["type"] == "iotaPump|Sicce|Syncra":
-                        return value["status"][1]
-                    if self.sensor["type"] == "vortech":
-                        return f"{value["status"][0]} {value["status"][1]} {value["status"][2]}"
-                    if self.sensor["type"] == "virtual" or self.sensor["type"] == "variable":
-                        if "config" in self.coordinator.data:
-                            config_data = self.coordinator.data["config"]
-                            if "oconf" in config_data:
-                                for config in self.coordinator.data["config"]["oconf"]:
-                                    if config["did"] == self.sensor["did"]:
-                                        if config["ctype"] == "Advanced":
-                                            return self.process_prog(config["prog"])
-                                        else:
-                                            return "Not an Advanced variable!"
-                            else:
-                                if self.sensor["type"] == "variable":
-                                    # _LOGGER.debug(f"get_value[state:variable]: {self.sensor|value}")
-                                    if "intensity" in value:
-                                        return value["intensity"]
-                    
+            return self.meta.value(data, did)
+
         if ftype == "attributes":
-            for value in self.coordinator.data["inputs"]:
-                if value["did"] == self.sensor["did"]:
-                    return value
-            for value in self.coordinator.data["outputs"]:
-                if value["did"] == self.sensor["did"]:
-                    if self.sensor["type"] == "dos":
-                        return value
-                    if self.sensor["type"] == "iotaPump|Sicce|Syncra":
-                        return value
-                    if self.sensor["type"] == "virtual" or self.sensor["type"] == "variable":
-                        if "config" in self.coordinator.data:
-                            config_data = self.coordinator.data["config"]
-                            if "oconf" in config_data:
-                                for config in self.coordinator.data["config"]["oconf"]:
-                                    if config["did"] == self.sensor["did"]:
-                                        return config
-                            else:
-                                return value
-                        else:
-                            return value
-    
-    def process_prog(self, prog):
-        if len(prog) > 255:
-            return None
-        if "Set PF" in prog:
-            return prog
-        test = re.findall("Set\s[^\d]*(\d+)", prog)
-        if test:
-            _LOGGER.debug(test[0])
-            return int(test[0])
-        else:
-            return prog     
-    
+            value = data.inputs.get(did)
+            if value is not None:
+                return self._state_attributes(value)
+            value = data.outputs.get(did)
+            if value is not None:
+                if self.sensor.type == "dos":
+                    return self._state_attributes(value)
+                if self.sensor.type == "iotaPump|Sicce|Syncra":
+                    return self._state_attributes(value)
+                if self.sensor.type == "virtual" or self.sensor.type == "variable":
+                    if "oconf" in data.config:
+                        return self._state_attributes(data.oconf.get(did))
+                    else:
+                        return self._state_attributes(value)
+
     @property
     def name(self):
-        return "apex_" + self.sensor["name"]
+        return "apex_" + self.sensor.name
+
+    @property
+    def update_keys(self):
+        if self.sensor.type == "feed":
+            return ("feed",)
+        return (self.sensor.did,)
+
+    @property
+    def available(self):
+        # Unavailable while its input or output is missing, until it comes back or is removed
+        if self.sensor.type == "feed" or not super().available:
+            return super().available
+        data = self.coordinator.data
+        return self.sensor.did in data.inputs or self.sensor.did in data.outputs
 
     @property
     def state(self):
@@ -173,30 +137,103 @@ class ApexSensor(ApexEntity, SensorEntity):
 
     @property
     def unit_of_measurement(self):
-        if "iconf" in self.coordinator.data["config"]:
-            for value in self.coordinator.data["config"]["iconf"]:
-                if value["did"] == self.sensor["did"]:
-                    if "range" in value["extra"]:
-                        if value["extra"]["range"] in MEASUREMENTS:
-                            return MEASUREMENTS[value["extra"]["range"]]
-        if self.sensor["type"] in SENSORS:
-            if "measurement" in SENSORS[self.sensor["type"]]:
-                if self.sensor["type"] == "Temp":
-                    return _SYSTEM_TEMP_UNIT
-                else:
-                    return SENSORS[self.sensor["type"]]["measurement"]
-        return None
+        return self.meta.unit
+
+    @property
+    def state_class(self):
+        return self.meta.state_class
+
+    @property
+    def icon(self):
+        return self.meta.icon
+
+
+class ApexConnectionSensor(ApexEntity, SensorEntity):
+    """Diagnostic showing whether polling is running or stopped by the circuit breaker."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_device_class = SensorDeviceClass.ENUM
+    _attr_options = [BREAKER_CLOSED, BREAKER_HALF_OPEN, BREAKER_OPEN]
+    _attr_icon = "mdi:lan-connect"
+
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+        self._device_id = "apex_connection"
+        # Required for HA 2022.7
+        self.coordinator_context = object()
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # The breaker changes state while polls fail, when the coordinator stays quiet
+        self.async_on_remove(self.coordinator.breaker.async_add_listener(self.async_write_ha_state))
+
+    @property
+    def name(self):
+        return "apex_Connection"
+
+    @property
+    def update_keys(self):
+        return ()
+
+    @property
+    def available(self):
+        # Stays available to report an open breaker
+        return True
+
+    @property
+    def native_value(self):
+        return self.coordinator.breaker.state
+
+    @property
+    def extra_state_attributes(self):
+        breaker = self.coordinator.breaker
+        return {
+            "failures": breaker.failures,
+            "probes": breaker.probes,
+            "last_error": breaker.last_error,
+            "retry_in": breaker.retry_in,
+            "opened_at": breaker.opened_at,
+        }
+
+
+class ApexMetricSensor(ApexEntity, SensorEntity):
+    """Diagnostic reporting one request or poll metric, see METRIC_SENSORS."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator, key):
+        self.coordinator = coordinator
+        self.key = key
+        self.metric = METRIC_SENSORS[key]
+        self._device_id = "apex_metric_" + key
+        # Required for HA 2022.7
+        self.coordinator_context = object()
+
+    @property
+    def name(self):
+        return "apex_" + self.metric["name"]
+
+    @property
+    def available(self):
+        # Keeps reporting while polls fail, the metrics are most useful then
+        return True
+
+    @property
+    def native_value(self):
+        if self.metric.get("client"):
+            return getattr(self.coordinator.apex, self.key)
+        return self.coordinator.metrics.value(self.key)
+
+    @property
+    def native_unit_of_measurement(self):
+        return self.metric.get("measurement")
 
     @property
     def state_class(self):
-        if self.sensor["type"] in SENSORS:
-            return SensorStateClass.MEASUREMENT
-        return None
+        if self.metric.get("total"):
+            return SensorStateClass.TOTAL_INCREASING
+        return SensorStateClass.MEASUREMENT
 
     @property
     def icon(self):
-        if self.sensor["type"] in SENSORS:
-            return SENSORS[self.sensor["type"]]["icon"]
-        else:
-            _LOGGER.debug("Missing icon: " + self.sensor["type"])
-            return None
+        return self.metric["icon"]
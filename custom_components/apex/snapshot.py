@@ -0,0 +1,82 @@
+"""Indexed view of the data returned by one Apex poll."""
+
+
+def index_by_did(items):
+    """Map a list of Apex config dicts by their did."""
+    return {item["did"]: item for item in items or ()}
+
+
+def index_records(records):
+    """Map a tuple of ApexInput/ApexOutput records by their did."""
+    return {record.did: record for record in records}
+
+
+def changed_dids(previous, current, changed):
+    """Add the dids that were added, removed or modified between two indexes to changed."""
+    for did, item in current.items():
+        old = previous.get(did)
+        if old is not item and old != item:
+            changed.add(did)
+    for did in previous:
+        if did not in current:
+            changed.add(did)
+
+
+class ApexSnapshot(object):
+    """Status and config of one poll with inputs, outputs, oconf and iconf keyed by did.
+
+    Built once per refresh from the parsed ApexStatus so entities can look up their
+    record with a dict access instead of scanning the payload. Treat it as read-only, a new snapshot replaces
+    it on the next refresh. The client returns the same config object while the
+    controller config is unchanged, in which case the config indexes of the previous
+    snapshot are reused.
+    """
+
+    __slots__ = ("system", "feed", "config", "inputs", "outputs", "oconf", "iconf")
+
+    def __init__(self, status, config, previous=None):
+        self.system = status.system
+        self.feed = status.feed
+        self.inputs = index_records(status.inputs)
+        self.outputs = index_records(status.outputs)
+        if previous is not None and config is not None and previous.config is config:
+            self.config = config
+            self.oconf = previous.oconf
+            self.iconf = previous.iconf
+        else:
+            self.config = config or {}
+            self.oconf = index_by_did(self.config.get("oconf"))
+            self.iconf = index_by_did(self.config.get("iconf"))
+
+    @property
+    def feed_active(self):
+        """Return True while a feed cycle is counting down."""
+        if not self.feed:
+            return False
+        if self.feed.apex_type == "old":
+            # Apex Classic reports 6 as no feed cycle running
+            return self.feed.name != 6
+        # Newer firmware reports a very large remaining time when no feed is running
+        return 0 < (self.feed.active or 0) <= 50000
+
+    def changes(self, previous):
+        """Return the keys that changed since the previous snapshot.
+
+        Keys are the dids of changed inputs, outputs, oconf and iconf entries plus "feed",
+        "system" and "nconf" for the respective payloads.
+        """
+        changed = set()
+        changed_dids(previous.inputs, self.inputs, changed)
+        changed_dids(previous.outputs, self.outputs, changed)
+        if previous.feed != self.feed:
+            changed.add("feed")
+        if previous.system != self.system:
+            changed.add("system")
+        if previous.config is self.config:
+            return changed
+        # Unchanged config entries are the same objects, so these are cheap identity checks
+        changed_dids(previous.oconf, self.oconf, changed)
+        changed_dids(previous.iconf, self.iconf, changed)
+        if previous.config.get("nconf") != self.config.get("nconf"):
+            changed.add("nconf")
+        return changed
@@ -2,8 +2,9 @@ import logging
 
 from homeassistant.components.switch import SwitchEntity
 
-from . import ApexEntity
-from .const import DOMAIN, SWITCHES, FEED_CYCLES
+from . import ApexEntity, ApexEntityInfo, ApexLayoutTracker
+from .const import DOMAIN, FEED_CYCLES, ATTRIBUTES, ATTRIBUTES_DEFAULT
+from .resolver import resolve_switch_icon
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -11,17 +12,22 @@ _LOGGER = logging.getLogger(__name__)
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Add the Switch from the config."""
     entry = hass.data[DOMAIN][config_entry.entry_id]
-    
+    options = config_entry.options
+
     """Loop through and add all avaliable outputs"""
-    for value in entry.data["outputs"]:
-        sw = Switch(entry, value, config_entry.options)
-        async_add_entities([sw], False)
+    tracker = ApexLayoutTracker(
+        hass, entry, async_add_entities,
+        outputs=lambda value: Switch(entry, ApexEntityInfo.from_record(value), options),
+    )
+    entities = tracker.build()
 
     """Add Feed Cycle Switches"""
-    for value in FEED_CYCLES:
-        _LOGGER.debug(value)
-        sw = Switch(entry, value, config_entry.options)
-        async_add_entities([sw], False)
+    entities += [Switch(entry, ApexEntityInfo(**value), options) for value in FEED_CYCLES]
+
+    # One registration for all switches, the coordinator already holds their data
+    async_add_entities(entities)
+    # Outputs added or removed on the controller later on
+    config_entry.async_on_unload(entry.async_add_layout_listener(tracker.async_update))
 
 
 class Switch(ApexEntity, SwitchEntity):
@@ -29,68 +35,69 @@ class Switch(ApexEntity, SwitchEntity):
 
     def __init__(self, coordinator, switch, options):
         _LOGGER.debug(switch)
-        self._device_id = "apex_" + switch["did"]
+        self._device_id = "apex_" + switch.did
         self.switch = switch
         self.coordinator = coordinator
+        self.attribute_profile = options.get(ATTRIBUTES, ATTRIBUTES_DEFAULT)
         self._state = None
+        self._icon = resolve_switch_icon(switch)
         # Required for HA 2022.7
         self.coordinator_context = object()
 
     async def async_turn_on(self, **kwargs):
-            if self.switch["type"] == "Feed":
-                update = await self.coordinator.hass.async_add_executor_job(
-                    self.coordinator.apex.toggle_feed_cycle,
-                    self.switch["did"],
-                    "ON"
-                )
-                if update["active"] == 1:
-                    self._state = True
+            if self.switch.type == "Feed":
+                update = await self.coordinator.commands.async_feed(self.switch.did, "ON")
+                # None if another feed cycle was started instead
+                if update is not None and update["active"] == 1:
                     _LOGGER.debug("Writing state ON")
-                    self.async_write_ha_state()
-                    await self.coordinator.async_request_refresh()
+                    self._async_write_optimistic(True)
             else:
-                update = await self.coordinator.hass.async_add_executor_job(
-                    self.coordinator.apex.toggle_output,
-                    self.switch["did"],
-                    "ON"
-                )
+                update = await self.coordinator.commands.async_output(self.switch.did, "ON")
                 _LOGGER.debug(f"async_turn_on -> Update: {update}")
                 if update["status"][0] == "ON" or update["status"][0] == "AON":
-                    self._state = True
-                    self.switch["status"] = update["status"]
                     _LOGGER.debug("Writing state ON")
-                    self.async_write_ha_state()
+                    self._async_write_optimistic(True)
 
            
     async def async_turn_off(self, **kwargs):
-            if self.switch["type"] == "Feed":
-                update = await self.coordinator.hass.async_add_executor_job(
-                    self.coordinator.apex.toggle_feed_cycle,
-                    self.switch["did"],
-                    "OFF"
-                )
-                if update["active"] == 92:
-                    self._state = False
-                    #self.switch["status"] = update["status"]
+            if self.switch.type == "Feed":
+                update = await self.coordinator.commands.async_feed(self.switch.did, "OFF")
+                if update is not None and update["active"] == 92:
                     _LOGGER.debug("Writing state OFF")
-                    self.async_write_ha_state()
-                    await self.coordinator.async_request_refresh()
+                    self._async_write_optimistic(False)
             else:
-                update = await self.coordinator.hass.async_add_executor_job(
-                    self.coordinator.apex.toggle_output, 
-                    self.switch["did"],
-                    "OFF"
-                )
+                update = await self.coordinator.commands.async_output(self.switch.did, "OFF")
                 _LOGGER.debug(f"async_turn_off -> Update: {update}")
                 if update["status"][0] == "OFF" or update["status"][0] == "AOF":
-                    self._state = False
-                    self.switch["status"] = update["status"]
                     _LOGGER.debug("Writing state OFF")
-                    self.async_write_ha_state()
+                    self._async_write_optimistic(False)
+
+    def _async_write_optimistic(self, state):
+        """Show the state a command reported until the next poll.
+
+        The controller may not apply it, so the polled state is written afterwards even
+        if the status did not change.
+        """
+        self._state = state
+        self.async_write_ha_state()
+        self.coordinator.async_mark_dirty(self.update_keys)
 
     @property
     def name(self):
-        return "apex_" + self.switch["name"]
+        return "apex_" + self.switch.name
+
+    @property
+    def update_keys(self):
+        if self.switch.type == "Feed":
+            return ("feed",)
+        return (self.switch.did,)
+
+    @property
+    def available(self):
+        # Unavailable while its output is missing, until it comes back or is removed
+        if self.switch.type == "Feed" or not super().available:
+            return super().available
+        return self.switch.did in self.coordinator.data.outputs
 
     @property
     def device_id(self):
@@ -104,35 +111,34 @@ class Switch(ApexEntity, SwitchEntity):
         elif self._state == False:
             self._state = None
             return False
-        if self.switch["type"] == "Feed":
-            if "feed" in self.coordinator.data and "name" in self.coordinator.data["feed"]:
+        if self.switch.type == "Feed":
+            feed = self.coordinator.data.feed
+            if feed is not None and feed.name is not None:
                 try:
-                    feed_id = int(self.switch["did"])
-                    return self.coordinator.data["feed"]["name"] == feed_id
+                    feed_id = int(self.switch.did)
+                    return feed.name == feed_id
                 except ValueError:
-                    _LOGGER.error(f"Invalid device ID format: {self.switch['did']}")
+                    _LOGGER.error(f"Invalid device ID format: {self.switch.did}")
                     return False
             else:
                 # _LOGGER.error("Feed data is missing from the coordinator data.")
                 return False
         else:
-            for value in self.coordinator.data["outputs"]:
-                if value["did"] == self.switch["did"]:
-                    if value["status"][0] == "ON" or value["status"][0] == "AON":
-                        return True
-                    else:
-                        return False
+            value = self.coordinator.data.outputs.get(self.switch.did)
+            if value is not None:
+                if value.status[0] == "ON" or value.status[0] == "AON":
+                    return True
+                else:
+                    return False
 
 
 
     @property
     def icon(self):
-        if self.switch["type"] in SWITCHES:
-            return SWITCHES[self.switch["type"]]["icon"]
-        else:
-            _LOGGER.debug("Missing icon: " + self.switch["type"])
-            return None
+        return self._icon
 
     @property
     def extra_state_attributes(self):
-        return self.switch
+        if self.switch.type == "Feed":
+            return self._state_attributes(self.switch)
+        return self._state_attributes(self.coordinator.data.outputs.get(self.switch.did))
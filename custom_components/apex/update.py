@@ -51,7 +51,7 @@ class ApexUpdate(
     ) -> None:
         """Install an update."""
         try:
-            data = await self.coordinator._hass.async_add_executor_job(self.coordinator.apex.update_firmware)
+            data = await self.coordinator.apex.update_firmware()
             if data == True:
                 _LOGGER.debug("Update Triggered, waiting ")
                 for progress in range(0, 100, 10):
@@ -65,19 +65,24 @@ class ApexUpdate(
         except Exception as err:
             raise HomeAssistantError("Error while updating firmware")
         self._attr_in_progress = False
+        self.coordinator.invalidate_config()
         await self.coordinator.async_refresh()
 
     @property
     def installed_version(self): 
-        return self.coordinator.data["system"]["software"].replace("L", "")
+        return self.coordinator.data.system.software.replace("L", "")
     
     @property
     def latest_version(self):
-        latest_firmware = (self.coordinator.data.get("config", {})
+        latest_firmware = (self.coordinator.data.config
                            .get("nconf", {})
                            .get("latestFirmware", "Not Available"))
         return latest_firmware
 
+    @property
+    def update_keys(self):
+        return ("system", "nconf")
+
     @property
     def name(self):
         return "apex_" + self.sensor
\ No newline at end of file
@@ -0,0 +1,77 @@
+"""Incremental reader for the classic /cgi-bin/status.xml document.
+
+Only early Apex Classic firmware without status.json needs this, so it is imported
+on first use rather than at startup.
+"""
+from xml.etree import ElementTree
+
+from .parser import ApexInput, ApexOutput, ApexStatus, ApexSystem
+
+
+class XmlStatusParser(object):
+    """Parse classic /cgi-bin/status.xml incrementally.
+
+    Each probe and outlet element becomes a record as soon as its end tag arrives and
+    is then dropped from the tree. Only the root and the element currently being read
+    stay in memory.
+    """
+
+    def __init__(self):
+        self._parser = ElementTree.XMLPullParser(("start", "end"))
+        self._open = []
+        self.system = None
+        self.inputs = []
+        self.outputs = []
+
+    def feed(self, chunk: bytes):
+        self._parser.feed(chunk)
+        self._read_events()
+
+    def close(self) -> ApexStatus:
+        try:
+            self._parser.close()
+        except ElementTree.ParseError as err:
+            raise ValueError(f"Invalid Apex status XML: {err}") from None
+        self._read_events()
+        if self.system is None:
+            raise ValueError("Incomplete Apex status document")
+        return ApexStatus(self.system, None, tuple(self.inputs), tuple(self.outputs))
+
+    def _read_events(self):
+        try:
+            events = list(self._parser.read_events())
+        except ElementTree.ParseError as err:
+            raise ValueError(f"Invalid Apex status XML: {err}") from None
+        open_elements = self._open
+        for event, element in events:
+            if event == "start":
+                if not open_elements and element.tag == "status":
+                    self.system = ApexSystem(
+                        element.get("software"),
+                        element.get("hardware", "") + " Legacy Version (Status.xml)",
+                    )
+                open_elements.append(element)
+                continue
+            open_elements.pop()
+            tag = element.tag
+            if tag == "probe":
+                name = element.findtext("name")
+                self.inputs.append(ApexInput(
+                    "base_" + name,
+                    element.findtext("type", "variable"),
+                    name,
+                    element.findtext("value", "").strip(),
+                ))
+            elif tag == "outlet":
+                self.outputs.append(ApexOutput(
+                    element.findtext("deviceID"),
+                    "outlet",
+                    element.findtext("name"),
+                    (element.findtext("state"), "", "OK", ""),
+                    element.findtext("outputID"),
+                ))
+            else:
+                continue
+            # Detach the finished element so the tree never grows past one record
+            if open_elements:
+                open_elements[-1].remove(element)
@@ -0,0 +1,72 @@
+"""Tests for the status parser."""
+import json
+
+import pytest
+
+from custom_components.apex.parser import (
+    ApexFeed,
+    ApexInput,
+    ApexOutput,
+    ApexSystem,
+    parse_status,
+)
+
+STATUS = {
+    "system": {"hostname": "Apex", "software": "5.12_1A24", "hardware": "1.0", "serial": "AC5:1"},
+    "modules": [{"abaddr": 1, "hwtype": "EB832"}],
+    "inputs": [
+        {"did": "base_Temp", "type": "Temp", "name": "Tmp", "value": 25.4},
+        {"did": "base_Sw1", "name": "Sw1 °℃", "value": 0},
+    ],
+    "outputs": [
+        {"did": "2_1", "type": "outlet", "name": "Heater", "ID": 0, "gid": "", "status": ["AON", "", "OK", ""]},
+        {"did": "2_2", "type": "variable", "name": "Light", "ID": 1, "status": ["TBL", "", "OK", ""], "intensity": 40},
+    ],
+    "feed": {"name": 0, "active": 4294967295},
+}
+
+EXPECTED_INPUTS = (
+    ApexInput("base_Temp", "Temp", "Tmp", 25.4),
+    ApexInput("base_Sw1", "variable", "Sw1 °℃", 0),
+)
+EXPECTED_OUTPUTS = (
+    ApexOutput("2_1", "outlet", "Heater", ("AON", "", "OK", ""), 0, ""),
+    ApexOutput("2_2", "variable", "Light", ("TBL", "", "OK", ""), 1, None, 40),
+)
+
+
+def test_parse_status():
+    status = parse_status(json.dumps(STATUS).encode())
+    assert status.system == ApexSystem("5.12_1A24", "1.0")
+    assert status.feed == ApexFeed(0, 4294967295, "new")
+    assert status.inputs == EXPECTED_INPUTS
+    assert status.outputs == EXPECTED_OUTPUTS
+
+
+def test_classic():
+    istat = {
+        "hostname": "Apex",
+        "software": "4.53_8C18",
+        "hardware": "1.0",
+        "serial": "AC4:1",
+        "inputs": STATUS["inputs"],
+        "outputs": STATUS["outputs"],
+        "feed": {"name": 6, "active": 0},
+    }
+    status = parse_status(json.dumps({"istat": istat}).encode(), classic=True)
+    assert status.system == ApexSystem("4.53_8C18", "Apex 1.0 AC4:1")
+    assert status.feed == ApexFeed(6, 0, "old")
+    assert status.outputs == EXPECTED_OUTPUTS
+
+
+def test_missing_sections():
+    status = parse_status(json.dumps({"system": STATUS["system"]}).encode())
+    assert status.feed is None
+    assert status.inputs == ()
+    assert status.outputs == ()
+
+
+def test_incomplete_document():
+    raw = json.dumps(STATUS).encode()
+    with pytest.raises(ValueError):
+        parse_status(raw[:-10])